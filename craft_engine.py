@@ -33,6 +33,7 @@ import re
 from datetime import datetime, timedelta, date
 from typing import Optional, Dict, List, Any, Tuple
 from collections import defaultdict
+from itertools import islice
 from contextlib import contextmanager
 
 log = logging.getLogger('craft.engine')
@@ -558,8 +559,8 @@ class CraftCampaignEngine:
         self._mailchimp = None
 
     def _init_schema(self):
-        self.db.conn.executescript(ENGINE_SCHEMA)
-        self.db.conn.commit()
+        with self.db.transaction() as conn:
+            conn.executescript(ENGINE_SCHEMA)
 
     @property
     def claude(self) -> Optional[ClaudeClient]:
@@ -701,10 +702,12 @@ class CraftCampaignEngine:
             city_count = 0
             type_count = 0
             if city:
-                city_prospects = self.db.get_city_prospects(city, exclude_emails=buyers, limit=5000)
+                city_prospects = self.db.get_city_prospects(city, exclude_emails=buyers, limit=5000,
+                                                            fields=('email',))
                 city_count = len(city_prospects)
             if event_type:
-                type_prospects = self.db.get_type_prospects(event_type, city=city, exclude_emails=buyers, limit=5000)
+                type_prospects = self.db.get_type_prospects(event_type, city=city, exclude_emails=buyers, limit=5000,
+                                                            fields=('email',))
                 type_count = len(type_prospects)
 
             segment_context = f"""AVAILABLE AUDIENCES:
@@ -738,12 +741,10 @@ class CraftCampaignEngine:
         # Velocity
         velocity_context = ""
         try:
-            snaps = self.db.get_snapshots(event_id)
-            if len(snaps) >= 2:
-                recent = snaps[:7]
-                if len(recent) >= 2:
-                    daily_vel = (recent[0]['tickets_cumulative'] - recent[-1]['tickets_cumulative']) / max(1, len(recent))
-                    velocity_context = f"VELOCITY: {daily_vel:.1f} tickets/day over last {len(recent)} days"
+            recent = list(islice(self.db.iter_snapshots(event_id), 7))
+            if len(recent) >= 2:
+                daily_vel = (recent[0]['tickets_cumulative'] - recent[-1]['tickets_cumulative']) / max(1, len(recent))
+                velocity_context = f"VELOCITY: {daily_vel:.1f} tickets/day over last {len(recent)} days"
         except Exception:
             pass
 
@@ -827,39 +828,38 @@ Use real numbers from the data above. Be specific about what makes THIS event wo
         else:
             cta_url += f"?utm_source=craft_ai&utm_medium=email&utm_campaign={campaign_id}"
 
-        self.db.conn.execute("""
-            INSERT INTO campaigns (id, event_id, campaign_type, phase, subject_line, preview_text,
-                body_html, cta_text, cta_url, segment_name, segment_sql, audience_count,
-                scheduled_send_at, status, barrier_addressed, confidence_score,
-                strategic_reasoning, predicted_open_rate, predicted_click_rate,
-                predicted_revenue)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'draft', ?, ?, ?, ?, ?, ?)
-        """, (
-            campaign_id, event_id, phase['name'], phase['name'],
-            result.get('subject_line', f'{event["name"]} — tickets available'),
-            result.get('preview_text', ''),
-            full_html,
-            result.get('cta_text', 'Get Tickets'),
-            cta_url,
-            result.get('segment_priority', f'{phase["name"]} audience'),
-            segment_sql,
-            audience_count,
-            send_at,
-            result.get('barrier_addressed', phase['barrier']),
-            result.get('confidence_score', 0.5),
-            result.get('strategic_reasoning', ''),
-            result.get('predicted_open_rate', 0.2),
-            result.get('predicted_click_rate', 0.03),
-            result.get('predicted_revenue', 0),
-        ))
-
-        # Log the phase transition
-        self.db.conn.execute("""
-            INSERT OR IGNORE INTO phase_log (event_id, phase, campaigns_generated)
-            VALUES (?, ?, 1)
-        """, (event_id, phase['name']))
-
-        self.db.conn.commit()
+        with self.db.transaction() as conn:
+            conn.execute("""
+                INSERT INTO campaigns (id, event_id, campaign_type, phase, subject_line, preview_text,
+                    body_html, cta_text, cta_url, segment_name, segment_sql, audience_count,
+                    scheduled_send_at, status, barrier_addressed, confidence_score,
+                    strategic_reasoning, predicted_open_rate, predicted_click_rate,
+                    predicted_revenue)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'draft', ?, ?, ?, ?, ?, ?)
+            """, (
+                campaign_id, event_id, phase['name'], phase['name'],
+                result.get('subject_line', f'{event["name"]} — tickets available'),
+                result.get('preview_text', ''),
+                full_html,
+                result.get('cta_text', 'Get Tickets'),
+                cta_url,
+                result.get('segment_priority', f'{phase["name"]} audience'),
+                segment_sql,
+                audience_count,
+                send_at,
+                result.get('barrier_addressed', phase['barrier']),
+                result.get('confidence_score', 0.5),
+                result.get('strategic_reasoning', ''),
+                result.get('predicted_open_rate', 0.2),
+                result.get('predicted_click_rate', 0.03),
+                result.get('predicted_revenue', 0),
+            ))
+
+            # Log the phase transition
+            conn.execute("""
+                INSERT OR IGNORE INTO phase_log (event_id, phase, campaigns_generated)
+                VALUES (?, ?, 1)
+            """, (event_id, phase['name']))
 
         log.info(f"Campaign generated: {campaign_id} for {event['name']} [{phase['name']}] → {audience_count} recipients")
 
@@ -1004,19 +1004,17 @@ Use real numbers from the data above. Be specific about what makes THIS event wo
     # ─────────────────────────────────────────────────────────
 
     def approve(self, campaign_id: str, approved_by: str = 'sam') -> Dict:
-        self.db.conn.execute("""
+        self.db.execute_write("""
             UPDATE campaigns SET status = 'approved', approved_by = ?, approved_at = ?, updated_at = ?
             WHERE id = ? AND status = 'draft'
         """, (approved_by, datetime.now().isoformat(), datetime.now().isoformat(), campaign_id))
-        self.db.conn.commit()
         return {'campaign_id': campaign_id, 'status': 'approved'}
 
     def reject(self, campaign_id: str) -> Dict:
-        self.db.conn.execute("""
+        self.db.execute_write("""
             UPDATE campaigns SET status = 'rejected', updated_at = ?
             WHERE id = ? AND status = 'draft'
         """, (datetime.now().isoformat(), campaign_id))
-        self.db.conn.commit()
         return {'campaign_id': campaign_id, 'status': 'rejected'}
 
     def send_campaign(self, campaign_id: str, dry_run: bool = False) -> Dict:
@@ -1062,9 +1060,8 @@ Use real numbers from the data above. Be specific about what makes THIS event wo
             }
 
         # Mark sending
-        self.db.conn.execute("UPDATE campaigns SET status = 'sending', updated_at = ? WHERE id = ?",
-                             (datetime.now().isoformat(), campaign_id))
-        self.db.conn.commit()
+        self.db.execute_write("UPDATE campaigns SET status = 'sending', updated_at = ? WHERE id = ?",
+                              (datetime.now().isoformat(), campaign_id))
 
         try:
             # Step 1: Push audience to Mailchimp with campaign-specific tag
@@ -1090,36 +1087,34 @@ Use real numbers from the data above. Be specific about what makes THIS event wo
             )
 
             if not mc_campaign_id:
-                self.db.conn.execute("UPDATE campaigns SET status = 'error', updated_at = ? WHERE id = ?",
-                                    (datetime.now().isoformat(), campaign_id))
-                self.db.conn.commit()
+                self.db.execute_write("UPDATE campaigns SET status = 'error', updated_at = ? WHERE id = ?",
+                                      (datetime.now().isoformat(), campaign_id))
                 return {'error': 'Failed to create Mailchimp campaign'}
 
             # Step 4: Send it
             sent_ok = self.mailchimp.send_campaign(mc_campaign_id)
             if not sent_ok:
-                self.db.conn.execute("UPDATE campaigns SET status = 'error', updated_at = ? WHERE id = ?",
-                                    (datetime.now().isoformat(), campaign_id))
-                self.db.conn.commit()
+                self.db.execute_write("UPDATE campaigns SET status = 'error', updated_at = ? WHERE id = ?",
+                                      (datetime.now().isoformat(), campaign_id))
                 return {'error': f'Mailchimp campaign {mc_campaign_id} created but failed to send'}
 
             # Record sends in local DB for tracking
             sent_count = member_stats.get('added', 0) + member_stats.get('updated', 0)
-            for email in emails:
-                try:
-                    self.db.conn.execute("""
-                        INSERT OR IGNORE INTO campaign_sends (campaign_id, email, first_name, mailchimp_campaign_id, status)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (campaign_id, email.lower().strip(), '', mc_campaign_id, 'sent'))
-                except Exception:
-                    pass
-
-            # Update campaign record
-            self.db.conn.execute("""
-                UPDATE campaigns SET status = 'sent', sends = ?, sent_at = ?, updated_at = ?
-                WHERE id = ?
-            """, (len(emails), datetime.now().isoformat(), datetime.now().isoformat(), campaign_id))
-            self.db.conn.commit()
+            with self.db.transaction() as conn:
+                for email in emails:
+                    try:
+                        conn.execute("""
+                            INSERT OR IGNORE INTO campaign_sends (campaign_id, email, first_name, mailchimp_campaign_id, status)
+                            VALUES (?, ?, ?, ?, ?)
+                        """, (campaign_id, email.lower().strip(), '', mc_campaign_id, 'sent'))
+                    except Exception:
+                        pass
+
+                # Update campaign record
+                conn.execute("""
+                    UPDATE campaigns SET status = 'sent', sends = ?, sent_at = ?, updated_at = ?
+                    WHERE id = ?
+                """, (len(emails), datetime.now().isoformat(), datetime.now().isoformat(), campaign_id))
 
             log.info(f"Campaign {campaign_id} sent via Mailchimp ({mc_campaign_id}): {len(emails)} recipients")
             return {
@@ -1132,9 +1127,8 @@ Use real numbers from the data above. Be specific about what makes THIS event wo
 
         except Exception as e:
             log.error(f"Campaign send failed: {e}", exc_info=True)
-            self.db.conn.execute("UPDATE campaigns SET status = 'error', updated_at = ? WHERE id = ?",
-                                (datetime.now().isoformat(), campaign_id))
-            self.db.conn.commit()
+            self.db.execute_write("UPDATE campaigns SET status = 'error', updated_at = ? WHERE id = ?",
+                                  (datetime.now().isoformat(), campaign_id))
             return {'error': f'Send failed: {str(e)}'}
 
     # ─────────────────────────────────────────────────────────
@@ -1147,30 +1141,30 @@ Use real numbers from the data above. Be specific about what makes THIS event wo
         email = ''
         ts = datetime.now().isoformat()
 
-        if event_type == 'unsubscribe':
-            email = data.get('data', {}).get('email', '').lower()
-            if email:
-                self.db.conn.execute("INSERT OR IGNORE INTO suppressions (email, reason) VALUES (?, 'unsubscribe')", (email,))
-        elif event_type == 'cleaned':
-            email = data.get('data', {}).get('email', '').lower()
+        with self.db.transaction() as conn:
+            if event_type == 'unsubscribe':
+                email = data.get('data', {}).get('email', '').lower()
+                if email:
+                    conn.execute("INSERT OR IGNORE INTO suppressions (email, reason) VALUES (?, 'unsubscribe')", (email,))
+            elif event_type == 'cleaned':
+                email = data.get('data', {}).get('email', '').lower()
+                if email:
+                    conn.execute("INSERT OR IGNORE INTO suppressions (email, reason) VALUES (?, 'bounce')", (email,))
+            elif event_type == 'campaign':
+                # Campaign sent notification — we can pull reports
+                mc_campaign_id = data.get('data', {}).get('id', '')
+                if mc_campaign_id:
+                    conn.execute("""
+                        INSERT INTO email_events (mailchimp_campaign_id, event_type, email, timestamp, raw_payload)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (mc_campaign_id, 'campaign_sent', '', ts, json.dumps(data)))
+
             if email:
-                self.db.conn.execute("INSERT OR IGNORE INTO suppressions (email, reason) VALUES (?, 'bounce')", (email,))
-        elif event_type == 'campaign':
-            # Campaign sent notification — we can pull reports
-            mc_campaign_id = data.get('data', {}).get('id', '')
-            if mc_campaign_id:
-                self.db.conn.execute("""
+                conn.execute("""
                     INSERT INTO email_events (mailchimp_campaign_id, event_type, email, timestamp, raw_payload)
                     VALUES (?, ?, ?, ?, ?)
-                """, (mc_campaign_id, 'campaign_sent', '', ts, json.dumps(data)))
-
-        if email:
-            self.db.conn.execute("""
-                INSERT INTO email_events (mailchimp_campaign_id, event_type, email, timestamp, raw_payload)
-                VALUES (?, ?, ?, ?, ?)
-            """, ('', event_type, email, ts, json.dumps(data)))
+                """, ('', event_type, email, ts, json.dumps(data)))
 
-        self.db.conn.commit()
         return {'processed': 1, 'type': event_type}
 
     def sync_campaign_stats(self, campaign_id: str) -> Optional[Dict]:
@@ -1200,11 +1194,10 @@ Use real numbers from the data above. Be specific about what makes THIS event wo
             clicks = report.get('clicks', {}).get('unique_clicks', 0)
             sends = report.get('emails_sent', 0)
 
-            self.db.conn.execute("""
+            self.db.execute_write("""
                 UPDATE campaigns SET opens = ?, clicks = ?, sends = ?, updated_at = ?
                 WHERE id = ?
             """, (opens, clicks, sends, datetime.now().isoformat(), campaign_id))
-            self.db.conn.commit()
 
             log.info(f"Synced stats for {campaign_id}: {opens} opens, {clicks} clicks, {sends} sends")
             return {'opens': opens, 'clicks': clicks, 'sends': sends}
@@ -1213,14 +1206,13 @@ Use real numbers from the data above. Be specific about what makes THIS event wo
 
     def _refresh_campaign_metrics(self):
         """Recalc campaign-level open/click counts from sends table."""
-        self.db.conn.execute("""
+        self.db.execute_write("""
             UPDATE campaigns SET
                 opens = (SELECT COUNT(*) FROM campaign_sends WHERE campaign_id = campaigns.id AND status IN ('opened','clicked')),
                 clicks = (SELECT COUNT(*) FROM campaign_sends WHERE campaign_id = campaigns.id AND status = 'clicked'),
                 updated_at = ?
             WHERE status = 'sent'
         """, (datetime.now().isoformat(),))
-        self.db.conn.commit()
 
     # ─────────────────────────────────────────────────────────
     # LEARNING LOOP — analyze sent campaigns, extract insights
@@ -1275,20 +1267,20 @@ Provide 2-3 specific, actionable learnings as JSON:
 
         if result and result.get('learnings'):
             event = self.db.get_event(campaign['event_id'])
-            for learning in result['learnings']:
-                self.db.conn.execute("""
-                    INSERT INTO system_learnings (category, event_type, city, learning, confidence, data_points, source_campaign_ids)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    learning.get('category', 'general'),
-                    event.get('event_type', '') if event else '',
-                    event.get('city', '') if event else '',
-                    learning.get('learning', ''),
-                    learning.get('confidence', 0.5),
-                    campaign['sends'],
-                    json.dumps([campaign_id]),
-                ))
-            self.db.conn.commit()
+            with self.db.transaction() as conn:
+                for learning in result['learnings']:
+                    conn.execute("""
+                        INSERT INTO system_learnings (category, event_type, city, learning, confidence, data_points, source_campaign_ids)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        learning.get('category', 'general'),
+                        event.get('event_type', '') if event else '',
+                        event.get('city', '') if event else '',
+                        learning.get('learning', ''),
+                        learning.get('confidence', 0.5),
+                        campaign['sends'],
+                        json.dumps([campaign_id]),
+                    ))
             log.info(f"Extracted {len(result['learnings'])} learnings from campaign {campaign_id}")
 
         return result
@@ -7,26 +7,77 @@ import sqlite3
 import hashlib
 import logging
 import statistics
+import threading
+import time
 import re
-from datetime import datetime, timedelta, date
+import importlib.util
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, date, timezone
+from email.utils import parsedate_to_datetime
 from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass, field, asdict
-from collections import defaultdict
-from contextlib import contextmanager
+from urllib.parse import urlencode
+from dataclasses import dataclass, field, fields
+from collections import defaultdict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from itertools import groupby, islice
+from operator import attrgetter
 from enum import Enum
 try:
-    import requests
+    import orjson
+    _HAS_ORJSON = True
 except ImportError:
-    requests = None
-try:
-    from flask import Flask, jsonify, request
-    from flask_cors import CORS
-    HAS_FLASK = True
-except ImportError:
-    HAS_FLASK = False
+    orjson = None
+    _HAS_ORJSON = False
+# Heavy optional deps are imported on first use so ETL/CLI runs skip them
+HAS_FLASK = (importlib.util.find_spec('flask') is not None
+             and importlib.util.find_spec('flask_cors') is not None)
+HAS_REQUESTS = importlib.util.find_spec('requests') is not None
+_requests = None
+def _get_requests():
+    """Import requests on first HTTP use and memoize the module."""
+    global _requests
+    if _requests is None:
+        import requests
+        _requests = requests
+    return _requests
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 log = logging.getLogger('craft')
+_intern = sys.intern
+
+# Event-name normalization tables (compiled once, used on every pattern lookup)
+_PATTERN_REPLACEMENTS = {
+    'philadelphia': 'philly', 'washington dc': 'dc', 'district': 'dc',
+    'new york': 'nyc', 'los angeles': 'la', 'san francisco': 'sf', 'san diego': 'sd',
+    'festival': 'fest', 'experience': 'exp', 'celebration': 'fest',
+    'tasting event': 'tasting', 'pop-up': 'popup', 'pop up': 'popup',
+}
+_RE_YEAR = re.compile(r'20\d{2}')
+_RE_NONALPHA = re.compile(r'[^a-z\s]')
+# ASCII fast path for _RE_NONALPHA: delete everything but a-z and whitespace
+_NONALPHA_TABLE = str.maketrans('', '', ''.join(
+    chr(i) for i in range(128) if not ('a' <= chr(i) <= 'z' or chr(i).isspace())
+))
+# Whitespace runs become '_' and a word-initial 'edition' is dropped along with its separator
+_RE_COLLAPSE = re.compile(r'\s+edition|\s+')
+# Longest keys first so e.g. 'washington dc' wins over any shorter overlapping key
+_RE_REPLACEMENTS = re.compile('|'.join(
+    re.escape(k) for k in sorted(_PATTERN_REPLACEMENTS, key=len, reverse=True)
+))
 
+# Campaign keyword cleaning (MetaAdsSync): years, season/edition words, punctuation
+_RE_KW_YEAR = re.compile(r'\b20\d{2}\b')
+_RE_KW_SEASON = re.compile(
+    r'\b(?:spring edition|fall edition|summer edition|winter edition|edition|spring|fall|summer|winter)\b',
+    re.IGNORECASE)
+_RE_PUNCT = re.compile(r'[^\w\s]')
+
+def _replace_pattern_word(m) -> str:
+    return _PATTERN_REPLACEMENTS[m.group(0)]
+
+@lru_cache(maxsize=4096)
 def _normalize_event_pattern(name: str, include_season: bool = False) -> str:
     """Single source of truth for event pattern extraction.
 
@@ -34,25 +85,28 @@ def _normalize_event_pattern(name: str, include_season: bool = False) -> str:
     produce the same pattern. Used for matching past editions, timed-entry grouping, and pacing curves.
     """
     name_lower = name.lower()
-    name_lower = re.sub(r'20\d{2}', '', name_lower)
-    replacements = {
-        'philadelphia': 'philly', 'washington dc': 'dc', 'district': 'dc',
-        'new york': 'nyc', 'los angeles': 'la', 'san francisco': 'sf', 'san diego': 'sd',
-        'festival': 'fest', 'experience': 'exp', 'celebration': 'fest',
-        'tasting event': 'tasting', 'pop-up': 'popup', 'pop up': 'popup',
-    }
-    for old, new in replacements.items():
-        name_lower = name_lower.replace(old, new)
+    name_lower = _RE_YEAR.sub('', name_lower)
+    name_lower = _RE_REPLACEMENTS.sub(_replace_pattern_word, name_lower)
     season = ''
     if include_season:
         if 'winter' in name_lower: season = '_winter'
         elif 'spring' in name_lower: season = '_spring'
         elif 'fall' in name_lower: season = '_fall'
-    name_lower = re.sub(r'[^a-z\s]', '', name_lower)
-    name_lower = '_'.join(name_lower.split())
-    name_lower = re.sub(r'_edition|_+', '_', name_lower).strip('_')
+    if name_lower.isascii():
+        name_lower = name_lower.translate(_NONALPHA_TABLE)
+    else:
+        name_lower = _RE_NONALPHA.sub('', name_lower)
+    name_lower = _RE_COLLAPSE.sub('_', name_lower.strip()).strip('_')
     return name_lower + season
 
+def _sql_norm_pattern(name):
+    """SQLite norm_pattern(): season-less pattern key, NULL-safe."""
+    return _normalize_event_pattern(name, include_season=False) if name is not None else None
+
+def clear_pattern_cache():
+    """Drop memoized event-name normalizations (e.g. after changing the replacement table)."""
+    _normalize_event_pattern.cache_clear()
+
 # Pattern aliases: map current Eventbrite names to their historical pattern equivalents.
 # "DC Wine Fest" (2026) was previously listed as "DC Wine Fest! Fall Edition" (2022-2025).
 PATTERN_ALIASES = {
@@ -62,17 +116,42 @@ PATTERN_ALIASES = {
 # Patterns that should be combined across ALL days into one event, not split by day-of-week.
 MULTI_DAY_COMBINE = {'dc_wine_fest_fall_fall'}
 
-def _json_key_match(json_field, key: str) -> bool:
-    """Check if key exists in a JSON dict field — safe, no substring false positives."""
-    if not key or not json_field:
-        return False
-    try:
-        d = json.loads(json_field) if isinstance(json_field, str) else json_field
-        if isinstance(d, dict):
-            return key in d
-    except (json.JSONDecodeError, TypeError):
-        pass
-    return False
+def _loads(s):
+    """Parse a JSON column — orjson when installed, stdlib otherwise."""
+    return orjson.loads(s) if _HAS_ORJSON else json.loads(s)
+
+# stdlib settings that match orjson's output (compact, UTF-8 as-is), so stored
+# JSON text is the same whether or not orjson is installed
+_JSON_COMPACT = {'separators': (',', ':'), 'ensure_ascii': False}
+
+def _dumps(obj) -> str:
+    """Serialize to a JSON column string (non-str dict keys become strings, as in stdlib)."""
+    if _HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, **_JSON_COMPACT)
+
+def _dumpb(obj) -> bytes:
+    """Serialize to JSON bytes for a BLOB column (no str round-trip under orjson)."""
+    if _HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, **_JSON_COMPACT).encode()
+
+def _intern_or_empty(s) -> str:
+    """Intern a low-cardinality column value (segment, city, type); NULL becomes ''."""
+    return _intern(s) if s else ''
+
+def _intern_keys(d: dict) -> dict:
+    return {_intern(k): v for k, v in d.items()}
+
+def _tally(tally: dict, value, favorite):
+    """Count value into tally and return the running favorite, which always equals
+    max(tally, key=tally.get): highest count, ties to the first-seen value."""
+    n = tally[value] = tally.get(value, 0) + 1
+    if favorite is None or n > tally[favorite]:
+        return value
+    if n == tally[favorite] and value != favorite:
+        return next(k for k in tally if k == value or k == favorite)
+    return favorite
 # =============================================================================
 # DATA MODELS
 # =============================================================================
@@ -82,7 +161,9 @@ class Decision(Enum):
     MAINTAIN = "maintain"
     COAST = "coast"
     NOT_STARTED = "not_started"
-@dataclass
+# Enum .value goes through a descriptor; serializers use these plain dict lookups instead
+_DECISION_STR = {d: d.value for d in Decision}
+@dataclass(slots=True)
 class Customer:
     """Complete customer record with LTV."""
     email: str
@@ -117,8 +198,8 @@ class Customer:
     ltv_score: float = 0      # 0-100 composite
     ltv_projected: float = 0  # Projected future value
     # Lists
-    events_attended: List[str] = field(default_factory=list)
-@dataclass
+    events_attended: Tuple[str, ...] = ()   # frozen after build, in first-attended order
+@dataclass(slots=True)
 class EventPacing:
     """Pacing analysis for an event."""
     event_id: str
@@ -154,11 +235,93 @@ class EventPacing:
     historical_comparisons: List[dict] = field(default_factory=list)
     # For timed-entry groups: the real DB event_ids that make up this grouped event
     constituent_event_ids: List[str] = field(default_factory=list)
+# Field names resolved once; the *_to_dict helpers avoid asdict()'s recursive deep copy
+_CUSTOMER_FIELD_NAMES = tuple(f.name for f in fields(Customer))
+_CUSTOMER_GETTER = attrgetter(*_CUSTOMER_FIELD_NAMES)
+_PACING_FIELD_NAMES = tuple(f.name for f in fields(EventPacing))
+_PACING_GETTER = attrgetter(*_PACING_FIELD_NAMES)
+def customer_to_dict(c: Customer) -> dict:
+    """Flat dict of a Customer (containers are shared, not copied)."""
+    return dict(zip(_CUSTOMER_FIELD_NAMES, _CUSTOMER_GETTER(c)))
+def pacing_to_dict(p: EventPacing) -> dict:
+    """Flat dict of an EventPacing (containers are shared, not copied)."""
+    return dict(zip(_PACING_FIELD_NAMES, _PACING_GETTER(p)))
+def _median_range(values) -> Tuple[float, float, float]:
+    """(upper median, min, max) of a non-empty sample from a single sort."""
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2], ordered[0], ordered[-1]
+# Customer columns written by the audience CSV exports
+CUSTOMER_EXPORT_FIELDS = ('email', 'favorite_city', 'favorite_event_type', 'rfm_segment',
+                          'total_orders', 'total_events', 'total_spent', 'ltv_score',
+                          'days_since_last', 'last_order_date')
+def _iter_csv(header, rows, chunk_size: int = 65536):
+    """Yield CSV text in ~64 KB chunks from an iterable of row tuples (for streamed responses)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= chunk_size:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+def _quintile_score(idx: int, n: int, reverse: bool = False) -> int:
+    """Map a rank (position in the sorted column) to a 1-5 RFM score."""
+    if n == 0:
+        return 3
+    pct = idx / n
+    if reverse:
+        pct = 1 - pct
+    if pct >= 0.8:
+        return 5
+    elif pct >= 0.6:
+        return 4
+    elif pct >= 0.4:
+        return 3
+    elif pct >= 0.2:
+        return 2
+    return 1
+@dataclass(slots=True)
+class CustomerColumns:
+    """Column-oriented (one array per field) view of the numbers RFM scoring reads.
+
+    Customer stays the per-record API; this is only for the bulk scoring pass.
+    Columns use the narrowest type that fits: int16 day deltas, uint16 order
+    counts, float32 spend. Out-of-range values are clamped on append.
+    """
+    DAYS_MAX = 32767        # int16
+    ORDERS_MAX = 65535      # uint16
+    emails: List[str] = field(default_factory=list)
+    days_since: array = field(default_factory=lambda: array('h'))
+    order_count: array = field(default_factory=lambda: array('H'))
+    total_spent: array = field(default_factory=lambda: array('f'))
+    def append(self, email: str, days_since: int, order_count: int, total_spent: float):
+        self.emails.append(email)
+        self.days_since.append(max(-self.DAYS_MAX, min(self.DAYS_MAX, days_since)))
+        self.order_count.append(min(self.ORDERS_MAX, order_count))
+        self.total_spent.append(total_spent)
+    def __len__(self) -> int:
+        return len(self.emails)
+    @staticmethod
+    def _column_scores(column, reverse: bool = False) -> array:
+        # Rank = index of the first equal value in the sorted column, so ties share a score
+        ranked = sorted(column)
+        n = len(ranked)
+        return array('b', (_quintile_score(bisect_left(ranked, v), n, reverse) for v in column))
+    def rfm_scores(self) -> List[Tuple[int, int, int]]:
+        """(recency, frequency, monetary) quintile scores, in row order."""
+        return list(zip(
+            self._column_scores(self.days_since, reverse=True),
+            self._column_scores(self.order_count),
+            self._column_scores(self.total_spent),
+        ))
 # =============================================================================
 # DATABASE - UNIFIED SCHEMA
 # =============================================================================
-UNIFIED_SCHEMA = """
--- Events (current and historical)
+# Tables stored clustered on their text primary key (WITHOUT ROWID). Each DDL is its
+# own constant so Database._migrate_without_rowid can rebuild older rowid copies from it.
+_EVENTS_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS events (
     event_id TEXT PRIMARY KEY,
     name TEXT NOT NULL,
@@ -169,8 +332,13 @@ CREATE TABLE IF NOT EXISTS events (
     status TEXT DEFAULT 'upcoming',  -- upcoming, live, completed
     platform TEXT DEFAULT 'eventbrite',
     meta_campaign_id TEXT,
+    pattern_key TEXT,  -- _normalize_event_pattern(name), no season
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
-);
+) WITHOUT ROWID;
+"""
+UNIFIED_SCHEMA = """
+-- Events (current and historical)
+""" + _EVENTS_TABLE_SQL + """
 -- All orders (historical + current)
 CREATE TABLE IF NOT EXISTS orders (
     order_id TEXT PRIMARY KEY,
@@ -214,6 +382,26 @@ CREATE TABLE IF NOT EXISTS customers (
     ltv_projected REAL DEFAULT 0,
     updated_at TEXT
 );
+-- Customer affinities, normalized from the customers JSON columns (one row per key)
+-- so type/city filters are index seeks instead of LIKE scans over the JSON text
+CREATE TABLE IF NOT EXISTS customer_event_types (
+    email TEXT NOT NULL,
+    event_type TEXT NOT NULL COLLATE NOCASE,
+    weight INTEGER DEFAULT 0,  -- orders of this type
+    PRIMARY KEY (email, event_type)
+);
+CREATE TABLE IF NOT EXISTS customer_cities (
+    email TEXT NOT NULL,
+    city TEXT NOT NULL COLLATE NOCASE,
+    weight INTEGER DEFAULT 0,  -- orders in this city
+    PRIMARY KEY (email, city)
+);
+CREATE TABLE IF NOT EXISTS customer_events_attended (
+    email TEXT NOT NULL,
+    event_name TEXT NOT NULL,
+    weight INTEGER DEFAULT 0,  -- position in first-attended order
+    PRIMARY KEY (email, event_name)
+);
 -- Daily snapshots (for pacing curves)
 CREATE TABLE IF NOT EXISTS daily_snapshots (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -229,6 +417,27 @@ CREATE TABLE IF NOT EXISTS daily_snapshots (
     ad_spend_cumulative REAL DEFAULT 0,
     UNIQUE(event_id, snapshot_date)
 );
+-- Order emails are stored lowercased (insert_order) so joins on email can use the
+-- index; this catches any writer that bypasses it
+CREATE TRIGGER IF NOT EXISTS trg_orders_email_lower AFTER INSERT ON orders
+WHEN NEW.email != lower(trim(NEW.email))
+BEGIN
+    UPDATE orders SET email = lower(trim(NEW.email)) WHERE order_id = NEW.order_id;
+END;
+-- Events whose snapshots changed since the last curve build (filled by triggers)
+CREATE TABLE IF NOT EXISTS pacing_dirty (
+    event_id TEXT PRIMARY KEY
+);
+CREATE TRIGGER IF NOT EXISTS trg_snapshots_dirty_insert AFTER INSERT ON daily_snapshots
+BEGIN
+    INSERT INTO pacing_dirty (event_id) SELECT NEW.event_id
+    WHERE NOT EXISTS (SELECT 1 FROM pacing_dirty WHERE event_id = NEW.event_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_snapshots_dirty_update AFTER UPDATE ON daily_snapshots
+BEGIN
+    INSERT INTO pacing_dirty (event_id) SELECT NEW.event_id
+    WHERE NOT EXISTS (SELECT 1 FROM pacing_dirty WHERE event_id = NEW.event_id);
+END;
 -- Pacing curves (aggregated from past events)
 CREATE TABLE IF NOT EXISTS pacing_curves (
     pattern TEXT PRIMARY KEY,
@@ -296,6 +505,13 @@ CREATE TABLE IF NOT EXISTS analysis_cache (
     analysis_json TEXT,
     updated_at TEXT
 );
+-- Meta campaign list per ad account (JSON bytes with a TTL; see get/set_meta_campaigns)
+CREATE TABLE IF NOT EXISTS meta_campaigns_cache (
+    ad_account_id TEXT PRIMARY KEY,
+    campaigns_blob BLOB,
+    fetched_at INTEGER,     -- unix seconds
+    ttl_seconds INTEGER DEFAULT 3600
+);
 -- Auto-exports: milestone-triggered exports
 CREATE TABLE IF NOT EXISTS auto_exports (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -321,11 +537,31 @@ CREATE TABLE IF NOT EXISTS alert_log (
 CREATE INDEX IF NOT EXISTS idx_orders_event ON orders(event_id);
 CREATE INDEX IF NOT EXISTS idx_orders_email ON orders(email);
 CREATE INDEX IF NOT EXISTS idx_orders_timestamp ON orders(order_timestamp);
-CREATE INDEX IF NOT EXISTS idx_snapshots_event ON daily_snapshots(event_id);
 CREATE INDEX IF NOT EXISTS idx_snapshots_days ON daily_snapshots(days_before_event);
 CREATE INDEX IF NOT EXISTS idx_customers_segment ON customers(rfm_segment);
 CREATE INDEX IF NOT EXISTS idx_customers_ltv ON customers(ltv_score DESC);
+CREATE INDEX IF NOT EXISTS idx_customers_orders_days ON customers(total_orders, days_since_last);
+CREATE INDEX IF NOT EXISTS idx_customers_events_spent ON customers(total_events, total_spent DESC);
+CREATE INDEX IF NOT EXISTS idx_customers_ltv_city ON customers(favorite_city, ltv_score DESC);
+CREATE INDEX IF NOT EXISTS idx_customers_ltv_type ON customers(favorite_event_type, ltv_score DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_event_type_email ON orders(event_id, ticket_type, email);
+-- Partial indexes for the non-empty guards the promo/ticket-type/distinct queries always apply
+CREATE INDEX IF NOT EXISTS idx_orders_promo ON orders(promo_code)
+    WHERE promo_code IS NOT NULL AND promo_code != '';
+CREATE INDEX IF NOT EXISTS idx_orders_ticket_type ON orders(ticket_type)
+    WHERE ticket_type IS NOT NULL AND ticket_type != '';
+CREATE INDEX IF NOT EXISTS idx_customers_city_nn ON customers(favorite_city)
+    WHERE favorite_city IS NOT NULL AND favorite_city != '';
+CREATE INDEX IF NOT EXISTS idx_customers_type_nn ON customers(favorite_event_type)
+    WHERE favorite_event_type IS NOT NULL AND favorite_event_type != '';
+CREATE INDEX IF NOT EXISTS idx_events_pattern ON events(pattern_key);
+CREATE INDEX IF NOT EXISTS idx_cet_type_email ON customer_event_types(event_type, email);
+CREATE INDEX IF NOT EXISTS idx_ccity_city_email ON customer_cities(city, email);
+CREATE INDEX IF NOT EXISTS idx_cea_event_email ON customer_events_attended(event_name, email);
 CREATE INDEX IF NOT EXISTS idx_events_date ON events(event_date);
+-- Days-out lookups range-scan (event_id, days_before_event); supersedes idx_snapshots_event
+DROP INDEX IF EXISTS idx_snapshots_event;
+CREATE INDEX IF NOT EXISTS idx_snapshots_event_days ON daily_snapshots(event_id, days_before_event);
 CREATE INDEX IF NOT EXISTS idx_cep_type_city ON customer_event_profiles(event_type, city);
 CREATE INDEX IF NOT EXISTS idx_cep_segment ON customer_event_profiles(rfm_segment);
 CREATE INDEX IF NOT EXISTS idx_cep_superspreader ON customer_event_profiles(is_superspreader);
@@ -336,40 +572,263 @@ CREATE INDEX IF NOT EXISTS idx_cep_group ON customer_event_profiles(group_size_s
 CREATE INDEX IF NOT EXISTS idx_cep_price_sens ON customer_event_profiles(price_sensitivity);
 """
 class Database:
-    """Unified database for all Craft data."""
-    def __init__(self, path: str = "craft_unified.db"):
+    """Unified database for all Craft data.
+
+    Each thread reads through its own connection (`conn`); batched writes
+    (`transaction`, `bulk_txn`) go through a single writer connection under a lock,
+    so HTTP reads are not queued behind an ingest."""
+    def __init__(self, path: str = "craft_unified.db", durable: bool = None):
         self.path = path
-        self.conn = sqlite3.connect(path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.conn.execute("PRAGMA foreign_keys = ON")
-        self.conn.execute("PRAGMA journal_mode = WAL")
+        if durable is None:
+            durable = os.environ.get('DB_DURABLE', '').lower() in ('1', 'true', 'yes')
+        self.durable = durable
+        self._tls = threading.local()
+        self._write_lock = threading.RLock()
+        self._write_conn = self._connect()
+        mode = self._write_conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != 'wal' and path != ':memory:':
+            # e.g. network filesystems without shared-memory support
+            log.warning(f"SQLite WAL unavailable for {path}; journal_mode={mode}")
         self._init_schema()
+    def _connect(self) -> sqlite3.Connection:
+        # Hot getters run per event/customer; keep their parsed statements cached
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=1024)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        # WAL + NORMAL only fsyncs at checkpoints; set DB_DURABLE=1 to fsync every commit
+        conn.execute(f"PRAGMA synchronous = {'FULL' if self.durable else 'NORMAL'}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA mmap_size = 268435456")   # 256 MB
+        conn.execute("PRAGMA cache_size = -65536")     # 64 MB
+        conn.execute("PRAGMA wal_autocheckpoint = 1000")
+        # norm_pattern(name) == events.pattern_key, callable from SQL
+        conn.create_function("norm_pattern", 1, _sql_norm_pattern, deterministic=True)
+        return conn
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use (in-memory databases share the writer)."""
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = self._write_conn if self.path == ':memory:' else self._connect()
+            self._tls.conn = conn
+        return conn
+    # Columns added after the first release: (table, column, DDL type)
+    _ADDED_COLUMNS = (
+        ('events', 'pattern_key', 'TEXT'),
+    )
+    # Text-keyed tables stored clustered on their primary key (no rowid b-tree): {table: DDL}
+    _WITHOUT_ROWID_TABLES = {'events': _EVENTS_TABLE_SQL}
+    # Bump whenever _normalize_event_pattern's rules change; stored pattern_key values
+    # are recomputed on the next open of a database below it (PRAGMA user_version)
+    PATTERN_KEY_VERSION = 1
     def _init_schema(self):
-        self.conn.executescript(UNIFIED_SCHEMA)
-        self.conn.commit()
+        self._migrate_columns()
+        self._migrate_without_rowid()
+        had_dirty_table = self._write_conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pacing_dirty'").fetchone()
+        self._write_conn.executescript(UNIFIED_SCHEMA)
+        if not had_dirty_table:
+            # Snapshots written before incremental curve builds never went through the
+            # pacing_dirty triggers; mark them all so the next build covers them
+            self._write_conn.execute(
+                "INSERT OR IGNORE INTO pacing_dirty (event_id) SELECT DISTINCT event_id FROM daily_snapshots")
+        self._write_conn.commit()
+        self._backfill_affinity_keys()
+        if self._write_conn.execute("PRAGMA user_version").fetchone()[0] < self.PATTERN_KEY_VERSION:
+            self.refresh_pattern_keys()
+            self._write_conn.execute(f"PRAGMA user_version = {self.PATTERN_KEY_VERSION}")
+        else:
+            self._backfill_pattern_keys()
+        # Refresh planner statistics for the composite indexes; analysis_limit bounds the cost
+        self._write_conn.execute("PRAGMA analysis_limit = 400")
+        self._write_conn.execute("ANALYZE")
+        self._write_conn.commit()
+    def _migrate_columns(self):
+        """Add _ADDED_COLUMNS missing from existing tables (before their indexes are built)."""
+        for table, column, ddl in self._ADDED_COLUMNS:
+            cols = [r[1] for r in self._write_conn.execute(f"PRAGMA table_info({table})").fetchall()]
+            if cols and column not in cols:
+                self._write_conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        self._write_conn.commit()
+    def _migrate_without_rowid(self):
+        """Rebuild _WITHOUT_ROWID_TABLES created as rowid tables; their indexes are
+        recreated by UNIFIED_SCHEMA afterwards."""
+        conn = self._write_conn
+        for table, ddl in self._WITHOUT_ROWID_TABLES.items():
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                               (table,)).fetchone()
+            if not row or 'WITHOUT ROWID' in row[0].upper():
+                continue
+            ddl = ddl.replace(f"IF NOT EXISTS {table} (", f"{table}_new (", 1)
+            cols = ', '.join(r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall())
+            log.info(f"Migrating {table} to a WITHOUT ROWID table...")
+            # orders references events; FK enforcement would block the DROP
+            conn.execute("PRAGMA foreign_keys = OFF")
+            try:
+                conn.executescript(f"""
+                    BEGIN IMMEDIATE;
+                    {ddl}
+                    INSERT INTO {table}_new ({cols}) SELECT {cols} FROM {table};
+                    DROP TABLE {table};
+                    ALTER TABLE {table}_new RENAME TO {table};
+                    COMMIT;
+                """)
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            finally:
+                conn.execute("PRAGMA foreign_keys = ON")
+    def _backfill_pattern_keys(self):
+        if not self.conn.execute("SELECT 1 FROM events WHERE pattern_key IS NULL LIMIT 1").fetchone():
+            return
+        with self.bulk_txn() as cur:
+            cur.execute("UPDATE events SET pattern_key = norm_pattern(name) WHERE pattern_key IS NULL")
+    def refresh_pattern_keys(self):
+        """Recompute every events.pattern_key (after the normalization rules change)."""
+        clear_pattern_cache()
+        with self.bulk_txn() as cur:
+            cur.execute("UPDATE events SET pattern_key = norm_pattern(name)")
+    def _backfill_affinity_keys(self):
+        """Build the affinity tables from the customers JSON columns for databases
+        created before they existed."""
+        if self.conn.execute("SELECT 1 FROM customer_events_attended LIMIT 1").fetchone():
+            return
+        if not self.conn.execute("SELECT 1 FROM customers LIMIT 1").fetchone():
+            return
+        with self.bulk_txn() as cur:
+            cur.execute("""
+                INSERT OR IGNORE INTO customer_event_types (email, event_type, weight)
+                SELECT c.email, j.key, j.value FROM customers c, json_each(c.event_types) j
+                WHERE json_valid(c.event_types)
+            """)
+            cur.execute("""
+                INSERT OR IGNORE INTO customer_cities (email, city, weight)
+                SELECT c.email, j.key, j.value FROM customers c, json_each(c.cities) j
+                WHERE json_valid(c.cities)
+            """)
+            cur.execute("""
+                INSERT OR IGNORE INTO customer_events_attended (email, event_name, weight)
+                SELECT c.email, j.value, j.key FROM customers c, json_each(c.events_attended) j
+                WHERE json_valid(c.events_attended)
+            """)
+    def checkpoint(self):
+        """Fold the WAL back into the main file and truncate it (call after long ingests)."""
+        if self.conn.in_transaction:
+            self.conn.commit()
+        with self._write_lock:
+            return self._write_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    def _acquire_writer(self) -> sqlite3.Connection:
+        """Take the write lock and return the writer, committing anything this thread left open."""
+        self._write_lock.acquire()
+        try:
+            if self.conn.in_transaction:
+                self.conn.commit()
+        except Exception:
+            self._write_lock.release()
+            raise
+        return self._write_conn
     @contextmanager
     def transaction(self):
+        conn = self._acquire_writer()
         try:
-            yield self.conn
-            self.conn.commit()
+            yield conn
+            conn.commit()
         except Exception as e:
-            self.conn.rollback()
+            conn.rollback()
             raise e
+        finally:
+            self._write_lock.release()
+    @contextmanager
+    def bulk_txn(self):
+        """Wrap a batch of writes in one BEGIN IMMEDIATE/COMMIT; yields a cursor for executemany."""
+        conn = self._acquire_writer()
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                yield cur
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+        finally:
+            self._write_lock.release()
+    def execute_write(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Run a single write statement on the writer and commit it."""
+        with self.transaction() as conn:
+            return conn.execute(sql, params)
+    def _fetch_dicts(self, query: str, params=()) -> List[dict]:
+        """Run a query and return plain dicts, skipping per-row sqlite3.Row construction."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        cur.execute(query, params)
+        keys = [d[0] for d in cur.description]
+        if len(set(keys)) != len(keys):
+            # Duplicate column names: keep the first, as Row lookup does
+            first = {}
+            for i, k in enumerate(keys):
+                first.setdefault(k, i)
+            return [{k: r[i] for k, i in first.items()} for r in cur.fetchall()]
+        return [dict(zip(keys, r)) for r in cur.fetchall()]
+    @staticmethod
+    def _iter_cursor(cur, size: int = 1000):
+        """Yield rows from a cursor in fetchmany() batches instead of one big fetchall()."""
+        while True:
+            chunk = cur.fetchmany(size)
+            if not chunk:
+                break
+            yield from chunk
+    @contextmanager
+    def _temp_email_set(self, emails):
+        """Materialize emails into TEMP table _email_set for SQL anti-joins; dropped on exit.
+
+        On ':memory:' the reader is the shared writer, so the block holds the write
+        lock rather than committing under another thread's open transaction."""
+        conn = self.conn
+        with self._write_lock if conn is self._write_conn else nullcontext():
+            cur = conn.cursor()
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS _email_set (email TEXT PRIMARY KEY)")
+            cur.execute("DELETE FROM temp._email_set")
+            cur.executemany("INSERT OR IGNORE INTO temp._email_set (email) VALUES (?)",
+                            ((e,) for e in emails))
+            conn.commit()
+            try:
+                yield cur
+            finally:
+                cur.execute("DROP TABLE IF EXISTS temp._email_set")
+                conn.commit()
+                cur.close()
     # === Events ===
+    _UPSERT_EVENT_SQL = """
+        INSERT OR REPLACE INTO events
+        (event_id, name, event_type, city, event_date, capacity, status, platform, meta_campaign_id,
+         pattern_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    @staticmethod
+    def _event_row(event: dict) -> tuple:
+        return (
+            event['event_id'], event['name'], event.get('event_type'),
+            event.get('city'), event['event_date'], event.get('capacity', 0),
+            event.get('status', 'upcoming'), event.get('platform', 'eventbrite'),
+            event.get('meta_campaign_id'),
+            _normalize_event_pattern(event['name'], include_season=False)
+        )
     def upsert_event(self, event: dict):
-        with self.transaction() as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO events
-                (event_id, name, event_type, city, event_date, capacity, status, platform, meta_campaign_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                event['event_id'], event['name'], event.get('event_type'),
-                event.get('city'), event['event_date'], event.get('capacity', 0),
-                event.get('status', 'upcoming'), event.get('platform', 'eventbrite'),
-                event.get('meta_campaign_id')
-            ))
+        self.upsert_events([event])
+    def upsert_events(self, events: List[dict]):
+        """Bulk upsert — one transaction, one executemany."""
+        with self.bulk_txn() as cur:
+            cur.executemany(self._UPSERT_EVENT_SQL, (self._event_row(e) for e in events))
+    _GET_EVENT_SQL = "SELECT * FROM events WHERE event_id = ?"
     def get_event(self, event_id: str) -> Optional[dict]:
-        row = self.conn.execute("SELECT * FROM events WHERE event_id = ?", (event_id,)).fetchone()
+        row = self.conn.execute(self._GET_EVENT_SQL, (event_id,)).fetchone()
         return dict(row) if row else None
     def get_events(self, status: str = None, upcoming_only: bool = False) -> List[dict]:
         query = "SELECT * FROM events"
@@ -384,8 +843,7 @@ class Database:
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
         query += " ORDER BY event_date"
-        rows = self.conn.execute(query, params).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(query, params)
     def get_past_events(self, pattern: str = None) -> List[dict]:
         query = "SELECT * FROM events WHERE event_date < ? AND status = 'completed'"
         params = [date.today().isoformat()]
@@ -393,86 +851,194 @@ class Database:
             query += " AND name LIKE ?"
             params.append(f"%{pattern}%")
         query += " ORDER BY event_date DESC"
-        rows = self.conn.execute(query, params).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(query, params)
     # === Orders ===
+    _INSERT_ORDER_SQL = """
+        INSERT OR REPLACE INTO orders
+        (order_id, event_id, email, order_timestamp, ticket_count,
+         gross_amount, net_amount, ticket_type, promo_code, days_before_event)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    @staticmethod
+    def _order_row(order: dict) -> tuple:
+        return (
+            order['order_id'], order['event_id'], order['email'].lower().strip(),
+            order['order_timestamp'], order.get('ticket_count', 1),
+            order.get('gross_amount', 0), order.get('net_amount', 0),
+            order.get('ticket_type'), order.get('promo_code'),
+            order.get('days_before_event')
+        )
     def insert_order(self, order: dict):
-        with self.transaction() as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO orders
-                (order_id, event_id, email, order_timestamp, ticket_count,
-                 gross_amount, net_amount, ticket_type, promo_code, days_before_event)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                order['order_id'], order['event_id'], order['email'].lower().strip(),
-                order['order_timestamp'], order.get('ticket_count', 1),
-                order.get('gross_amount', 0), order.get('net_amount', 0),
-                order.get('ticket_type'), order.get('promo_code'),
-                order.get('days_before_event')
-            ))
+        self.insert_orders([order])
+    def insert_orders(self, orders: List[dict]):
+        """Bulk insert — one transaction, one executemany."""
+        with self.bulk_txn() as cur:
+            cur.executemany(self._INSERT_ORDER_SQL, (self._order_row(o) for o in orders))
+    _ORDERS_FOR_EVENT_SQL = "SELECT * FROM orders WHERE event_id = ? ORDER BY order_timestamp"
+    _ORDERS_FOR_CUSTOMER_SQL = """
+        SELECT o.*, e.name as event_name, e.event_type, e.city, e.event_date
+        FROM orders o
+        JOIN events e ON o.event_id = e.event_id
+        WHERE o.email = ?
+        ORDER BY o.order_timestamp DESC
+    """
+    _ORDERS_BY_CUSTOMER_SQL = """
+        SELECT o.*, e.name as event_name, e.event_type, e.city, e.event_date
+        FROM orders o
+        JOIN events e ON o.event_id = e.event_id
+        ORDER BY o.email, o.order_timestamp DESC
+    """
+    _CUSTOMER_AGGREGATES_SQL = """
+        SELECT o.email, COUNT(*), COALESCE(SUM(o.ticket_count), 0),
+               COALESCE(SUM(o.gross_amount), 0),
+               MIN(o.order_timestamp), MAX(o.order_timestamp)
+        FROM orders o
+        JOIN events e ON o.event_id = e.event_id
+        GROUP BY o.email
+    """
+    _EVENT_EMAILS_SQL = "SELECT DISTINCT email FROM orders WHERE event_id = ?"
+    _EVENT_TICKETS_SQL = "SELECT COALESCE(SUM(ticket_count), 0) as total FROM orders WHERE event_id = ?"
+    _EVENT_REVENUE_SQL = "SELECT COALESCE(SUM(gross_amount), 0) as total FROM orders WHERE event_id = ?"
     def get_orders_for_event(self, event_id: str) -> List[dict]:
-        rows = self.conn.execute(
-            "SELECT * FROM orders WHERE event_id = ? ORDER BY order_timestamp",
-            (event_id,)
-        ).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(self._ORDERS_FOR_EVENT_SQL, (event_id,))
     def get_orders_for_customer(self, email: str) -> List[dict]:
-        rows = self.conn.execute("""
-            SELECT o.*, e.name as event_name, e.event_type, e.city, e.event_date
-            FROM orders o
-            JOIN events e ON o.event_id = e.event_id
-            WHERE o.email = ?
-            ORDER BY o.order_timestamp DESC
-        """, (email.lower().strip(),)).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(self._ORDERS_FOR_CUSTOMER_SQL, (email.lower().strip(),))
+    def iter_orders_by_customer(self):
+        """Yield (email, orders) for every customer from one ordered scan; each
+        orders list matches get_orders_for_customer(email)."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        cur.execute(self._ORDERS_BY_CUSTOMER_SQL)
+        keys = [d[0] for d in cur.description]
+        rows = (dict(zip(keys, r)) for r in self._iter_cursor(cur))
+        for email, orders in groupby(rows, key=lambda o: o['email']):
+            yield email, list(orders)
+    def get_customer_aggregates(self) -> Dict[str, tuple]:
+        """{email: (orders, tickets, spent, first_ts, last_ts)}, aggregated in SQL over
+        the same rows iter_orders_by_customer() yields."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        cur.execute(self._CUSTOMER_AGGREGATES_SQL)
+        return {r[0]: r[1:] for r in cur.fetchall()}
     def get_all_emails(self) -> List[str]:
         rows = self.conn.execute("SELECT DISTINCT email FROM orders").fetchall()
         return [r['email'] for r in rows]
+    def iter_event_purchasers(self, event_id: str):
+        cur = self.conn.execute(self._EVENT_EMAILS_SQL, (event_id,))
+        return (r['email'] for r in self._iter_cursor(cur))
     def get_event_purchasers(self, event_id: str) -> List[str]:
-        rows = self.conn.execute(
-            "SELECT DISTINCT email FROM orders WHERE event_id = ?", (event_id,)
-        ).fetchall()
-        return [r['email'] for r in rows]
+        return list(self.iter_event_purchasers(event_id))
     def get_event_tickets(self, event_id: str) -> int:
-        row = self.conn.execute(
-            "SELECT COALESCE(SUM(ticket_count), 0) as total FROM orders WHERE event_id = ?",
-            (event_id,)
-        ).fetchone()
+        row = self.conn.execute(self._EVENT_TICKETS_SQL, (event_id,)).fetchone()
         return row['total'] if row else 0
+    def get_daily_order_aggregates(self, event_id: str) -> List[tuple]:
+        """[(day, tickets, revenue, orders)] per order date, oldest first.
+
+        Days are the timestamp's own date prefix (SQLite date() would shift
+        offset timestamps to UTC); rows without a valid date are skipped. Plain
+        date() passes impossible days like 2024-02-30 through, so a prefix only
+        counts if '+0 days' (which rolls those over) leaves it unchanged."""
+        return self.conn.execute("""
+            SELECT substr(order_timestamp, 1, 10) AS d,
+                   SUM(COALESCE(NULLIF(ticket_count, 0), 1)),
+                   SUM(COALESCE(gross_amount, 0)), COUNT(*)
+            FROM orders
+            WHERE event_id = ?
+              AND date(substr(order_timestamp, 1, 10), '+0 days') = substr(order_timestamp, 1, 10)
+            GROUP BY d ORDER BY d
+        """, (event_id,)).fetchall()
+    def get_event_tickets_bulk(self, event_ids) -> Dict[str, int]:
+        """{event_id: tickets sold} for many events in one query; missing events map to 0."""
+        totals = dict.fromkeys(event_ids, 0)
+        totals.update(self.conn.execute("""
+            SELECT event_id, COALESCE(SUM(ticket_count), 0) FROM orders
+            WHERE event_id IN (SELECT value FROM json_each(?))
+            GROUP BY event_id
+        """, (_dumps(list(totals)),)).fetchall())
+        return totals
     def get_event_revenue(self, event_id: str) -> float:
-        row = self.conn.execute(
-            "SELECT COALESCE(SUM(gross_amount), 0) as total FROM orders WHERE event_id = ?",
-            (event_id,)
-        ).fetchone()
+        row = self.conn.execute(self._EVENT_REVENUE_SQL, (event_id,)).fetchone()
         return row['total'] if row else 0
+    def get_event_revenue_bulk(self, event_ids) -> Dict[str, float]:
+        """{event_id: gross revenue} for many events in one query; missing events map to 0."""
+        totals = dict.fromkeys(event_ids, 0)
+        totals.update(self.conn.execute("""
+            SELECT event_id, COALESCE(SUM(gross_amount), 0) FROM orders
+            WHERE event_id IN (SELECT value FROM json_each(?))
+            GROUP BY event_id
+        """, (_dumps(list(totals)),)).fetchall())
+        return totals
     # === Customers ===
+    _UPSERT_CUSTOMER_SQL = """
+        INSERT OR REPLACE INTO customers
+        (email, total_orders, total_tickets, total_spent, total_events,
+         first_order_date, last_order_date, days_since_last, tenure_days,
+         avg_order_value, avg_tickets_per_order, avg_days_between_orders,
+         avg_days_before_event, favorite_event_type, favorite_city,
+         event_types, cities, events_attended, timing_segment,
+         rfm_r, rfm_f, rfm_m, rfm_segment, ltv_score, ltv_projected, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    @staticmethod
+    def _customer_row(customer: Customer, updated_at: str) -> tuple:
+        return (
+            customer.email, customer.total_orders, customer.total_tickets,
+            customer.total_spent, customer.total_events_attended,
+            customer.first_order_date, customer.last_order_date,
+            customer.days_since_last_order, customer.customer_tenure_days,
+            customer.avg_order_value, customer.avg_tickets_per_order,
+            customer.avg_days_between_orders, customer.avg_days_before_event,
+            customer.favorite_event_type, customer.favorite_city,
+            _dumps(customer.event_types), _dumps(customer.cities),
+            _dumps(customer.events_attended), customer.timing_segment,
+            customer.rfm_recency, customer.rfm_frequency, customer.rfm_monetary,
+            customer.rfm_segment, customer.ltv_score, customer.ltv_projected,
+            updated_at
+        )
     def upsert_customer(self, customer: Customer):
-        with self.transaction() as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO customers
-                (email, total_orders, total_tickets, total_spent, total_events,
-                 first_order_date, last_order_date, days_since_last, tenure_days,
-                 avg_order_value, avg_tickets_per_order, avg_days_between_orders,
-                 avg_days_before_event, favorite_event_type, favorite_city,
-                 event_types, cities, events_attended, timing_segment,
-                 rfm_r, rfm_f, rfm_m, rfm_segment, ltv_score, ltv_projected, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                customer.email, customer.total_orders, customer.total_tickets,
-                customer.total_spent, customer.total_events_attended,
-                customer.first_order_date, customer.last_order_date,
-                customer.days_since_last_order, customer.customer_tenure_days,
-                customer.avg_order_value, customer.avg_tickets_per_order,
-                customer.avg_days_between_orders, customer.avg_days_before_event,
-                customer.favorite_event_type, customer.favorite_city,
-                json.dumps(customer.event_types), json.dumps(customer.cities),
-                json.dumps(customer.events_attended), customer.timing_segment,
-                customer.rfm_recency, customer.rfm_frequency, customer.rfm_monetary,
-                customer.rfm_segment, customer.ltv_score, customer.ltv_projected,
-                datetime.now().isoformat()
-            ))
+        self.upsert_customers([customer])
+    def upsert_customers(self, customers: List[Customer]):
+        """Bulk upsert — one transaction, one executemany per table."""
+        now = datetime.now().isoformat()
+        with self.bulk_txn() as cur:
+            cur.executemany(self._UPSERT_CUSTOMER_SQL,
+                            (self._customer_row(c, now) for c in customers))
+            # Refresh the normalized affinity tables from the new JSON-backed fields
+            emails = [(c.email,) for c in customers]
+            cur.executemany("DELETE FROM customer_event_types WHERE email = ?", emails)
+            cur.executemany("DELETE FROM customer_cities WHERE email = ?", emails)
+            cur.executemany("DELETE FROM customer_events_attended WHERE email = ?", emails)
+            cur.executemany(
+                "INSERT OR IGNORE INTO customer_event_types (email, event_type, weight) VALUES (?, ?, ?)",
+                ((c.email, t, n) for c in customers for t, n in c.event_types.items()))
+            cur.executemany(
+                "INSERT OR IGNORE INTO customer_cities (email, city, weight) VALUES (?, ?, ?)",
+                ((c.email, k, n) for c in customers for k, n in c.cities.items()))
+            cur.executemany(
+                "INSERT OR IGNORE INTO customer_events_attended (email, event_name, weight) VALUES (?, ?, ?)",
+                ((c.email, name, i) for c in customers for i, name in enumerate(c.events_attended)))
+    @staticmethod
+    def _affinity_filter(event_type: str = None, city: str = None,
+                         match_any: bool = True) -> Tuple[str, list]:
+        """SQL fragment limiting `customers` rows to an event-type and/or city affinity.
+
+        With both given, match_any keeps customers with either one; otherwise both are required.
+        """
+        clauses, params = [], []
+        if event_type:
+            clauses.append("EXISTS (SELECT 1 FROM customer_event_types t "
+                           "WHERE t.email = customers.email AND t.event_type = ?)")
+            params.append(event_type)
+        if city:
+            clauses.append("EXISTS (SELECT 1 FROM customer_cities t "
+                           "WHERE t.email = customers.email AND t.city = ?)")
+            params.append(city)
+        if not clauses:
+            return "", []
+        return " AND (" + (" OR " if match_any else " AND ").join(clauses) + ")", params
+    _GET_CUSTOMER_SQL = "SELECT * FROM customers WHERE email = ?"
     def get_customer(self, email: str) -> Optional[Customer]:
-        row = self.conn.execute("SELECT * FROM customers WHERE email = ?", (email.lower(),)).fetchone()
+        row = self.conn.execute(self._GET_CUSTOMER_SQL, (email.lower(),)).fetchone()
         if not row:
             return None
         return Customer(
@@ -489,16 +1055,16 @@ class Database:
             avg_tickets_per_order=row['avg_tickets_per_order'],
             avg_days_between_orders=row['avg_days_between_orders'],
             avg_days_before_event=row['avg_days_before_event'],
-            favorite_event_type=row['favorite_event_type'] or '',
-            favorite_city=row['favorite_city'] or '',
-            event_types=json.loads(row['event_types'] or '{}'),
-            cities=json.loads(row['cities'] or '{}'),
-            events_attended=json.loads(row['events_attended'] or '[]'),
-            timing_segment=row['timing_segment'] or '',
+            favorite_event_type=_intern_or_empty(row['favorite_event_type']),
+            favorite_city=_intern_or_empty(row['favorite_city']),
+            event_types=_intern_keys(_loads(row['event_types'])) if row['event_types'] else {},
+            cities=_intern_keys(_loads(row['cities'])) if row['cities'] else {},
+            events_attended=tuple(_loads(row['events_attended'])) if row['events_attended'] else (),
+            timing_segment=_intern_or_empty(row['timing_segment']),
             rfm_recency=row['rfm_r'],
             rfm_frequency=row['rfm_f'],
             rfm_monetary=row['rfm_m'],
-            rfm_segment=row['rfm_segment'] or '',
+            rfm_segment=_intern_or_empty(row['rfm_segment']),
             ltv_score=row['ltv_score'],
             ltv_projected=row['ltv_projected']
         )
@@ -533,8 +1099,7 @@ class Database:
         order = 'DESC' if order.upper() == 'DESC' else 'ASC'
         query += f" ORDER BY {sort_by} {order} LIMIT ? OFFSET ?"
         params.extend([limit, offset])
-        rows = self.conn.execute(query, params).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(query, params)
     def get_customer_count(self, segment: str = None, search: str = None,
                            city: str = None, event_type: str = None) -> int:
         query = "SELECT COUNT(*) as cnt FROM customers WHERE 1=1"
@@ -568,50 +1133,51 @@ class Database:
         """).fetchall()
         return [r['favorite_event_type'] for r in rows]
     # === Event-Scoped Customer Profiles ===
-    def upsert_event_profile(self, profile: dict):
-        """Insert or update a customer_event_profiles row."""
-        self.conn.execute("""
-            INSERT INTO customer_event_profiles
-                (email, event_type, city, orders_in_scope, tickets_in_scope, spent_in_scope,
-                 events_in_scope, first_order_date, last_order_date, days_since_last,
-                 avg_order_value, avg_tickets_per_order, avg_days_between_orders,
-                 avg_days_before_event, timing_segment, rfm_r, rfm_f, rfm_m, rfm_segment,
-                 ltv_score, is_superspreader, is_vip, churn_risk_level, days_until_churn,
-                 gap_ratio, price_sensitivity, social_influence_score, cross_event_affinity,
-                 buying_momentum, purchase_velocity, upgrade_likelihood, daypart_preference,
-                 group_size_segment, updated_at)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            ON CONFLICT(email, event_type, city) DO UPDATE SET
-                orders_in_scope=excluded.orders_in_scope,
-                tickets_in_scope=excluded.tickets_in_scope,
-                spent_in_scope=excluded.spent_in_scope,
-                events_in_scope=excluded.events_in_scope,
-                first_order_date=excluded.first_order_date,
-                last_order_date=excluded.last_order_date,
-                days_since_last=excluded.days_since_last,
-                avg_order_value=excluded.avg_order_value,
-                avg_tickets_per_order=excluded.avg_tickets_per_order,
-                avg_days_between_orders=excluded.avg_days_between_orders,
-                avg_days_before_event=excluded.avg_days_before_event,
-                timing_segment=excluded.timing_segment,
-                rfm_r=excluded.rfm_r, rfm_f=excluded.rfm_f, rfm_m=excluded.rfm_m,
-                rfm_segment=excluded.rfm_segment,
-                ltv_score=excluded.ltv_score,
-                is_superspreader=excluded.is_superspreader,
-                is_vip=excluded.is_vip,
-                churn_risk_level=excluded.churn_risk_level,
-                days_until_churn=excluded.days_until_churn,
-                gap_ratio=excluded.gap_ratio,
-                price_sensitivity=excluded.price_sensitivity,
-                social_influence_score=excluded.social_influence_score,
-                cross_event_affinity=excluded.cross_event_affinity,
-                buying_momentum=excluded.buying_momentum,
-                purchase_velocity=excluded.purchase_velocity,
-                upgrade_likelihood=excluded.upgrade_likelihood,
-                daypart_preference=excluded.daypart_preference,
-                group_size_segment=excluded.group_size_segment,
-                updated_at=excluded.updated_at
-        """, (
+    _UPSERT_EVENT_PROFILE_SQL = """
+        INSERT INTO customer_event_profiles
+            (email, event_type, city, orders_in_scope, tickets_in_scope, spent_in_scope,
+             events_in_scope, first_order_date, last_order_date, days_since_last,
+             avg_order_value, avg_tickets_per_order, avg_days_between_orders,
+             avg_days_before_event, timing_segment, rfm_r, rfm_f, rfm_m, rfm_segment,
+             ltv_score, is_superspreader, is_vip, churn_risk_level, days_until_churn,
+             gap_ratio, price_sensitivity, social_influence_score, cross_event_affinity,
+             buying_momentum, purchase_velocity, upgrade_likelihood, daypart_preference,
+             group_size_segment, updated_at)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        ON CONFLICT(email, event_type, city) DO UPDATE SET
+            orders_in_scope=excluded.orders_in_scope,
+            tickets_in_scope=excluded.tickets_in_scope,
+            spent_in_scope=excluded.spent_in_scope,
+            events_in_scope=excluded.events_in_scope,
+            first_order_date=excluded.first_order_date,
+            last_order_date=excluded.last_order_date,
+            days_since_last=excluded.days_since_last,
+            avg_order_value=excluded.avg_order_value,
+            avg_tickets_per_order=excluded.avg_tickets_per_order,
+            avg_days_between_orders=excluded.avg_days_between_orders,
+            avg_days_before_event=excluded.avg_days_before_event,
+            timing_segment=excluded.timing_segment,
+            rfm_r=excluded.rfm_r, rfm_f=excluded.rfm_f, rfm_m=excluded.rfm_m,
+            rfm_segment=excluded.rfm_segment,
+            ltv_score=excluded.ltv_score,
+            is_superspreader=excluded.is_superspreader,
+            is_vip=excluded.is_vip,
+            churn_risk_level=excluded.churn_risk_level,
+            days_until_churn=excluded.days_until_churn,
+            gap_ratio=excluded.gap_ratio,
+            price_sensitivity=excluded.price_sensitivity,
+            social_influence_score=excluded.social_influence_score,
+            cross_event_affinity=excluded.cross_event_affinity,
+            buying_momentum=excluded.buying_momentum,
+            purchase_velocity=excluded.purchase_velocity,
+            upgrade_likelihood=excluded.upgrade_likelihood,
+            daypart_preference=excluded.daypart_preference,
+            group_size_segment=excluded.group_size_segment,
+            updated_at=excluded.updated_at
+    """
+    @staticmethod
+    def _event_profile_row(profile: dict, updated_at: str) -> tuple:
+        return (
             profile['email'], profile['event_type'], profile['city'],
             profile['orders_in_scope'], profile['tickets_in_scope'], profile['spent_in_scope'],
             profile['events_in_scope'], profile['first_order_date'], profile['last_order_date'],
@@ -625,9 +1191,17 @@ class Database:
             profile.get('cross_event_affinity', 0), profile.get('buying_momentum'),
             profile.get('purchase_velocity', 0), profile.get('upgrade_likelihood', 0),
             profile.get('daypart_preference'), profile.get('group_size_segment'),
-            datetime.now().isoformat()
-        ))
-        self.conn.commit()
+            updated_at
+        )
+    def upsert_event_profile(self, profile: dict):
+        """Insert or update a customer_event_profiles row."""
+        self.upsert_event_profiles([profile])
+    def upsert_event_profiles(self, profiles: List[dict]):
+        """Bulk insert/update customer_event_profiles rows in a single transaction."""
+        now = datetime.now().isoformat()
+        with self.bulk_txn() as cur:
+            cur.executemany(self._UPSERT_EVENT_PROFILE_SQL,
+                            (self._event_profile_row(p, now) for p in profiles))
 
     def get_event_profiles(self, event_type: str, city: str,
                            segment: str = None, min_ltv: float = None,
@@ -661,9 +1235,8 @@ class Database:
         if vips_only:
             query += " AND cep.is_vip = 1"
         if churn_levels:
-            ph = ','.join(['?' for _ in churn_levels])
-            query += f" AND cep.churn_risk_level IN ({ph})"
-            params.extend(churn_levels)
+            query += " AND cep.churn_risk_level IN (SELECT value FROM json_each(?))"
+            params.append(_dumps(list(churn_levels)))
         if momentum:
             query += " AND cep.buying_momentum = ?"
             params.append(momentum)
@@ -678,8 +1251,7 @@ class Database:
             params.append(timing_segment)
         query += " ORDER BY cep.ltv_score DESC LIMIT ?"
         params.append(limit)
-        rows = self.conn.execute(query, params).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(query, params)
 
     def get_event_profile_segment_counts(self, event_type: str, city: str) -> Dict[str, int]:
         """Segment counts scoped to a specific event type + city."""
@@ -720,54 +1292,70 @@ class Database:
             WHERE rfm_segment IS NOT NULL AND rfm_segment != ''
         """
         params: list = []
-        if event_type and city:
-            query += " AND (event_types LIKE ? OR cities LIKE ?)"
-            params.extend([f'%"{event_type}"%', f'%"{city}"%'])
-        elif event_type:
-            query += " AND event_types LIKE ?"
-            params.append(f'%"{event_type}"%')
-        elif city:
-            query += " AND cities LIKE ?"
-            params.append(f'%"{city}"%')
+        affinity_sql, affinity_params = self._affinity_filter(event_type, city)
+        query += affinity_sql
+        params.extend(affinity_params)
         query += " GROUP BY rfm_segment"
         rows = self.conn.execute(query, params).fetchall()
         return {r['rfm_segment']: r['cnt'] for r in rows}
+    @staticmethod
+    def _projection(fields) -> str:
+        """SELECT list for a customers query: the given (trusted) column names, or all columns."""
+        return ', '.join(fields) if fields else '*'
     def get_high_value_customers(self, event_type: str = None, city: str = None,
-                                 min_ltv: float = 50, limit: int = 500) -> List[dict]:
-        """Get high-value customers for targeting, optionally filtered by affinity."""
-        query = "SELECT * FROM customers WHERE ltv_score >= ?"
+                                 min_ltv: float = 50, limit: int = 500,
+                                 fields: tuple = None) -> List[dict]:
+        """Get high-value customers for targeting, optionally filtered by affinity.
+        Pass `fields` to fetch only those columns instead of the full (JSON-heavy) row."""
+        query = f"SELECT {self._projection(fields)} FROM customers WHERE ltv_score >= ?"
         params = [min_ltv]
-        if event_type:
-            query += " AND event_types LIKE ?"
-            params.append(f'%"{event_type}"%')
-        if city:
-            query += " AND cities LIKE ?"
-            params.append(f'%"{city}"%')
+        affinity_sql, affinity_params = self._affinity_filter(event_type, city, match_any=False)
+        query += affinity_sql
+        params.extend(affinity_params)
         query += " ORDER BY ltv_score DESC LIMIT ?"
         params.append(limit)
-        rows = self.conn.execute(query, params).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(query, params)
+    def count_high_value_customers(self, event_type: str = None, city: str = None,
+                                   min_ltv: float = 50, limit: int = None) -> int:
+        """len(get_high_value_customers(...)) counted in SQLite; capped at `limit` if given."""
+        query = "SELECT 1 FROM customers WHERE ltv_score >= ?"
+        params = [min_ltv]
+        affinity_sql, affinity_params = self._affinity_filter(event_type, city, match_any=False)
+        query += affinity_sql
+        params.extend(affinity_params)
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return self.conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
     def get_at_risk_customers(self, min_orders: int = 2, min_days_inactive: int = 180,
-                               event_type: str = None, city: str = None) -> List[dict]:
+                               event_type: str = None, city: str = None,
+                               match_any: bool = True) -> List[dict]:
         """Get customers who used to be active but haven't purchased recently.
-        Optionally filter to customers relevant to a specific event type/city."""
+        Optionally filter to customers relevant to a specific event type/city
+        (either one by default; both with match_any=False)."""
         query = """
             SELECT * FROM customers
             WHERE total_orders >= ? AND days_since_last >= ?
         """
         params: list = [min_orders, min_days_inactive]
-        if event_type and city:
-            query += " AND (event_types LIKE ? OR cities LIKE ?)"
-            params.extend([f'%"{event_type}"%', f'%"{city}"%'])
-        elif event_type:
-            query += " AND event_types LIKE ?"
-            params.append(f'%"{event_type}"%')
-        elif city:
-            query += " AND cities LIKE ?"
-            params.append(f'%"{city}"%')
+        affinity_sql, affinity_params = self._affinity_filter(event_type, city, match_any)
+        query += affinity_sql
+        params.extend(affinity_params)
         query += " ORDER BY total_spent DESC"
-        rows = self.conn.execute(query, params).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(query, params)
+    def count_at_risk_customers(self, min_orders: int = 2, min_days_inactive: int = 180,
+                                event_type: str = None, city: str = None,
+                                match_any: bool = True) -> int:
+        """len(get_at_risk_customers(...)) counted in SQLite."""
+        query = """
+            SELECT COUNT(*) FROM customers
+            WHERE total_orders >= ? AND days_since_last >= ?
+        """
+        params: list = [min_orders, min_days_inactive]
+        affinity_sql, affinity_params = self._affinity_filter(event_type, city, match_any)
+        query += affinity_sql
+        params.extend(affinity_params)
+        return self.conn.execute(query, params).fetchone()[0]
     # === Intelligence Queries ===
     def get_cross_sell_candidates(self, event_type: str, city: str,
                                    exclude_event_ids: list = None,
@@ -775,40 +1363,26 @@ class Database:
                                    limit: int = 2000) -> List[dict]:
         """Find customers who attended OTHER event types in same city — cross-sell targets.
         E.g., Beer Fest buyers who might like Cocktail Fest."""
-        rows = self.conn.execute("""
-            SELECT DISTINCT o.email, e.event_type, e.city, e.name as event_name
+        query = """
+            SELECT c.*, json_group_array(DISTINCT e.event_type) AS attended_types
             FROM orders o
             JOIN events e ON o.event_id = e.event_id
+            JOIN customers c ON c.email = o.email
             WHERE e.city = ? AND e.event_type != ? AND e.event_type IS NOT NULL
-            ORDER BY o.order_timestamp DESC
-        """, (city, event_type)).fetchall()
-        # Group by email, track which event types they've attended
-        email_types = defaultdict(set)
-        for r in rows:
-            email_types[r['email']].add(r['event_type'])
-        # Get customer records in batch
-        emails = [e for e in email_types if (not exclude_emails or e not in exclude_emails)][:limit * 2]
-        if not emails:
-            return []
-        cust_map = {}
-        batch_size = 500
-        for i in range(0, len(emails), batch_size):
-            batch = emails[i:i + batch_size]
-            ph = ','.join(['?' for _ in batch])
-            cust_rows = self.conn.execute(
-                f"SELECT * FROM customers WHERE email IN ({ph})", batch
-            ).fetchall()
-            for c in cust_rows:
-                cust_map[c['email']] = dict(c)
-        results = []
-        for email in emails:
-            cust = cust_map.get(email)
-            if cust:
-                cust['attended_types'] = list(email_types[email])
-                results.append(cust)
-            if len(results) >= limit:
-                break
-        results.sort(key=lambda x: -(x.get('ltv_score', 0) or 0))
+              {exclude}
+            GROUP BY c.email
+            ORDER BY COALESCE(c.ltv_score, 0) DESC, MAX(o.order_timestamp) DESC
+            LIMIT ?
+        """
+        params = (city, event_type, limit)
+        if exclude_emails:
+            with self._temp_email_set(exclude_emails):
+                results = self._fetch_dicts(query.format(
+                    exclude="AND o.email NOT IN (SELECT email FROM temp._email_set)"), params)
+        else:
+            results = self._fetch_dicts(query.format(exclude=""), params)
+        for r in results:
+            r['attended_types'] = _loads(r['attended_types'])
         return results
 
     def get_multi_ticket_buyers(self, min_avg_tickets: float = 1.5,
@@ -820,18 +1394,11 @@ class Database:
             WHERE avg_tickets_per_order >= ? AND total_orders >= 2
         """
         params: list = [min_avg_tickets]
-        if event_type and city:
-            query += " AND (event_types LIKE ? OR cities LIKE ?)"
-            params.extend([f'%"{event_type}"%', f'%"{city}"%'])
-        elif event_type:
-            query += " AND event_types LIKE ?"
-            params.append(f'%"{event_type}"%')
-        elif city:
-            query += " AND cities LIKE ?"
-            params.append(f'%"{city}"%')
+        affinity_sql, affinity_params = self._affinity_filter(event_type, city)
+        query += affinity_sql
+        params.extend(affinity_params)
         query += " ORDER BY avg_tickets_per_order DESC, total_spent DESC"
-        rows = self.conn.execute(query, params).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(query, params)
 
     def get_promo_code_stats(self, event_id: str = None) -> List[dict]:
         """Get promo code usage stats — which codes drive sales and at what discount."""
@@ -863,57 +1430,43 @@ class Database:
         if not event:
             return {}
         # Get orders for this event with timing data
-        rows = self.conn.execute("""
+        return self._fetch_dicts("""
             SELECT days_before_event, COUNT(*) as order_count, SUM(ticket_count) as tickets,
                    SUM(gross_amount) as revenue
             FROM orders
             WHERE event_id = ? AND days_before_event IS NOT NULL
             GROUP BY days_before_event
             ORDER BY days_before_event DESC
-        """, (event_id,)).fetchall()
-        return [dict(r) for r in rows]
+        """, (event_id,))
 
     def get_churn_risk_customers(self, lookback_window: int = 90,
                                  event_type: str = None, city: str = None) -> List[dict]:
         """Find customers approaching their churn point based on purchase gap patterns.
         If avg_days_between_orders is 120 and they're at 100 days since last, they're at risk.
         Optionally filter to customers relevant to a specific event type/city."""
+        # Inner query filters and derives the ratios; outer one buckets and ranks, all in one scan.
+        # days_until_churn: days until gap_ratio reaches 2.0 (= missed 2 cycles)
         query = """
             SELECT *,
-                   CASE WHEN avg_days_between_orders > 0
-                        THEN CAST(days_since_last AS REAL) / avg_days_between_orders
-                        ELSE 0 END as gap_ratio
-            FROM customers
-            WHERE total_orders >= 2
-              AND avg_days_between_orders > 0
-              AND days_since_last >= (avg_days_between_orders * 0.7)
+                   CASE WHEN days_until_churn < 14 THEN 'critical'
+                        WHEN days_until_churn < 30 THEN 'urgent'
+                        WHEN days_until_churn < 60 THEN 'watch'
+                        ELSE 'healthy' END as save_window
+            FROM (
+                SELECT *,
+                       ROUND(CAST(days_since_last AS REAL) / avg_days_between_orders, 2) as gap_ratio,
+                       MAX(0, CAST(avg_days_between_orders * 2.0 - days_since_last AS INTEGER))
+                           as days_until_churn
+                FROM customers
+                WHERE total_orders >= 2
+                  AND avg_days_between_orders > 0
+                  AND days_since_last >= (avg_days_between_orders * 0.7)
+                  {affinity}
+            )
+            ORDER BY CAST(days_since_last AS REAL) / avg_days_between_orders DESC
         """
-        params: list = []
-        if event_type and city:
-            query += " AND (event_types LIKE ? OR cities LIKE ?)"
-            params.extend([f'%"{event_type}"%', f'%"{city}"%'])
-        elif event_type:
-            query += " AND event_types LIKE ?"
-            params.append(f'%"{event_type}"%')
-        elif city:
-            query += " AND cities LIKE ?"
-            params.append(f'%"{city}"%')
-        query += " ORDER BY gap_ratio DESC"
-        rows = self.conn.execute(query, params).fetchall()
-        results = []
-        for r in rows:
-            d = dict(r)
-            gap_ratio = d.get('gap_ratio', 0) or 0
-            avg_gap = d.get('avg_days_between_orders', 0) or 0
-            days_since = d.get('days_since_last', 0) or 0
-            # Predict days until churn (when gap_ratio reaches 2.0 = missed 2 cycles)
-            churn_threshold = avg_gap * 2.0
-            days_until_churn = max(0, int(churn_threshold - days_since))
-            d['gap_ratio'] = round(gap_ratio, 2)
-            d['days_until_churn'] = days_until_churn
-            d['save_window'] = 'critical' if days_until_churn < 14 else 'urgent' if days_until_churn < 30 else 'watch' if days_until_churn < 60 else 'healthy'
-            results.append(d)
-        return results
+        affinity_sql, affinity_params = self._affinity_filter(event_type, city)
+        return self._fetch_dicts(query.format(affinity=affinity_sql), affinity_params)
 
     def get_vip_customers(self, min_events: int = 3, min_spent: float = 200,
                            limit: int = 100,
@@ -925,23 +1478,16 @@ class Database:
             WHERE total_events >= ? AND total_spent >= ?
         """
         params: list = [min_events, min_spent]
-        if event_type and city:
-            query += " AND (event_types LIKE ? OR cities LIKE ?)"
-            params.extend([f'%"{event_type}"%', f'%"{city}"%'])
-        elif event_type:
-            query += " AND event_types LIKE ?"
-            params.append(f'%"{event_type}"%')
-        elif city:
-            query += " AND cities LIKE ?"
-            params.append(f'%"{city}"%')
+        affinity_sql, affinity_params = self._affinity_filter(event_type, city)
+        query += affinity_sql
+        params.extend(affinity_params)
         query += " ORDER BY total_spent DESC LIMIT ?"
         params.append(limit)
-        rows = self.conn.execute(query, params).fetchall()
-        return [dict(r) for r in rows]
+        return self._fetch_dicts(query, params)
 
     def get_event_ticket_types(self, event_id: str) -> List[dict]:
         """Break down ticket types for an event — GA vs VIP vs Early Bird etc."""
-        rows = self.conn.execute("""
+        return self._fetch_dicts("""
             SELECT ticket_type, COUNT(*) as orders, SUM(ticket_count) as tickets,
                    SUM(gross_amount) as revenue, AVG(gross_amount) as avg_price,
                    AVG(days_before_event) as avg_days_before
@@ -949,8 +1495,7 @@ class Database:
             WHERE event_id = ? AND ticket_type IS NOT NULL AND ticket_type != ''
             GROUP BY ticket_type
             ORDER BY tickets DESC
-        """, (event_id,)).fetchall()
-        return [dict(r) for r in rows]
+        """, (event_id,))
 
     def get_segment_ticket_preferences(self) -> dict:
         """Which RFM segments prefer which ticket tiers?"""
@@ -958,7 +1503,7 @@ class Database:
             SELECT c.rfm_segment, o.ticket_type, COUNT(*) as count,
                    AVG(o.gross_amount) as avg_price
             FROM orders o
-            JOIN customers c ON lower(o.email) = c.email
+            JOIN customers c ON o.email = c.email
             WHERE o.ticket_type IS NOT NULL AND o.ticket_type != ''
               AND c.rfm_segment IS NOT NULL AND c.rfm_segment != ''
             GROUP BY c.rfm_segment, o.ticket_type
@@ -976,21 +1521,23 @@ class Database:
     # === Targeting ===
     def get_event_buyers(self, event_id: str) -> set:
         """Get set of emails that have orders for a specific event."""
-        rows = self.conn.execute(
-            "SELECT DISTINCT lower(email) as email FROM orders WHERE event_id = ?",
-            (event_id,)
-        ).fetchall()
-        return {r['email'] for r in rows}
+        cur = self.conn.execute(self._EVENT_EMAILS_SQL, (event_id,))
+        return {r['email'] for r in self._iter_cursor(cur)}
     def get_pattern_event_ids(self, pattern: str, exclude_ids: list = None) -> List[str]:
-        """Get all event IDs matching a pattern name (for finding past editions)."""
-        rows = self.conn.execute("SELECT event_id, name FROM events").fetchall()
-        matched = []
-        for r in rows:
-            candidate = _normalize_event_pattern(r['name'], include_season=False)
-            if candidate == pattern or pattern in candidate or candidate in pattern:
-                if not exclude_ids or r['event_id'] not in exclude_ids:
-                    matched.append(r['event_id'])
-        return matched
+        """Get all event IDs matching a pattern name (for finding past editions).
+
+        Matches on the stored pattern_key: equal, or either one containing the other."""
+        query = """
+            SELECT event_id FROM events
+            WHERE (pattern_key = ? OR instr(pattern_key, ?) > 0 OR instr(?, pattern_key) > 0)
+        """
+        params = [pattern, pattern, pattern]
+        if exclude_ids:
+            query += " AND event_id NOT IN (SELECT value FROM json_each(?))"
+            params.append(_dumps(list(exclude_ids)))
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return [r[0] for r in cur.execute(query + " ORDER BY event_id", params).fetchall()]
     def get_past_attendees_not_purchased(self, event_id: str, event_name: str,
                                           limit: int = 2000,
                                           current_buyer_emails: set = None,
@@ -1012,176 +1559,249 @@ class Database:
         past_event_ids = self.get_pattern_event_ids(pattern, exclude_ids=ids_to_exclude)
         if not past_event_ids:
             return []
-        # Get all past attendee emails
-        placeholders = ','.join(['?' for _ in past_event_ids])
-        rows = self.conn.execute(f"""
-            SELECT DISTINCT lower(o.email) as email,
-                   COUNT(DISTINCT o.event_id) as past_editions,
-                   SUM(o.gross_amount) as past_spent,
-                   MAX(o.order_timestamp) as last_purchase
-            FROM orders o
-            WHERE o.event_id IN ({placeholders})
-            GROUP BY lower(o.email)
-            ORDER BY past_spent DESC
-        """, past_event_ids).fetchall()
-        # Filter out current buyers
-        eligible = [r for r in rows if r['email'] not in current_buyers]
-        if not eligible:
-            return []
-        # Batch fetch customer records (fixes N+1 query)
-        emails_to_fetch = [r['email'] for r in eligible[:limit * 2]]
-        cust_map = {}
-        batch_size = 500
-        for i in range(0, len(emails_to_fetch), batch_size):
-            batch = emails_to_fetch[i:i + batch_size]
-            ph = ','.join(['?' for _ in batch])
-            cust_rows = self.conn.execute(
-                f"SELECT * FROM customers WHERE email IN ({ph})", batch
-            ).fetchall()
-            for c in cust_rows:
-                cust_map[c['email']] = dict(c)
-        results = []
-        for r in eligible:
-            cust = cust_map.get(r['email'])
-            if cust:
-                cust['past_editions'] = r['past_editions']
-                cust['past_event_spent'] = r['past_spent']
-                cust['last_event_purchase'] = r['last_purchase']
-                results.append(cust)
-            if len(results) >= limit:
-                break
-        return results
+        # Past attendees joined to their profiles; current buyers removed by an anti-join
+        query = """
+            SELECT c.*,
+                   a.past_editions,
+                   a.past_spent as past_event_spent,
+                   a.last_purchase as last_event_purchase
+            FROM (
+                SELECT o.email,
+                       COUNT(DISTINCT o.event_id) as past_editions,
+                       SUM(o.gross_amount) as past_spent,
+                       MAX(o.order_timestamp) as last_purchase
+                FROM orders o
+                WHERE o.event_id IN (SELECT value FROM json_each(?))
+                GROUP BY o.email
+            ) a
+            JOIN customers c ON c.email = a.email
+            {exclude}
+            ORDER BY a.past_spent DESC, a.email
+            LIMIT ?
+        """
+        params = (_dumps(past_event_ids), limit)
+        if current_buyers:
+            with self._temp_email_set(current_buyers):
+                return self._fetch_dicts(query.format(
+                    exclude="LEFT JOIN temp._email_set x ON x.email = a.email WHERE x.email IS NULL"),
+                    params)
+        return self._fetch_dicts(query.format(exclude=""), params)
     def get_city_prospects(self, city: str, exclude_emails: set = None,
-                           limit: int = 1000) -> List[dict]:
-        """Get customers in a city who might be interested (bought other events there)."""
-        rows = self.conn.execute("""
-            SELECT * FROM customers
+                           limit: int = 1000, fields: tuple = None) -> List[dict]:
+        """Get customers in a city who might be interested (bought other events there).
+        `fields` limits the columns fetched (must include email when excluding)."""
+        rows = self._fetch_dicts(f"""
+            SELECT {self._projection(fields)} FROM customers
             WHERE favorite_city = ? AND ltv_score >= 20
             ORDER BY ltv_score DESC
             LIMIT ?
-        """, (city, limit)).fetchall()
-        results = []
-        for r in rows:
-            if exclude_emails and r['email'] in exclude_emails:
-                continue
-            results.append(dict(r))
-        return results
+        """, (city, limit))
+        if exclude_emails:
+            rows = [r for r in rows if r['email'] not in exclude_emails]
+        return rows
     def get_type_prospects(self, event_type: str, city: str = '',
                            exclude_emails: set = None,
-                           limit: int = 1000) -> List[dict]:
-        """Get customers who like this event type AND are in the same city."""
+                           limit: int = 1000, fields: tuple = None) -> List[dict]:
+        """Get customers who like this event type AND are in the same city.
+        `fields` limits the columns fetched (must include email when excluding)."""
+        query = f"""
+            SELECT {self._projection(fields)} FROM customers
+            WHERE (favorite_event_type = ? OR EXISTS (
+                    SELECT 1 FROM customer_event_types t
+                    WHERE t.email = customers.email AND t.event_type = ?))
+              {{city}}
+              AND ltv_score >= 20
+            ORDER BY ltv_score DESC
+            LIMIT ?
+        """
         if city:
             # Primary: same city + same type (strongest signal)
-            rows = self.conn.execute("""
-                SELECT * FROM customers
-                WHERE (favorite_event_type = ? OR event_types LIKE ?)
-                  AND favorite_city = ?
-                  AND ltv_score >= 20
-                ORDER BY ltv_score DESC
-                LIMIT ?
-            """, (event_type, f'%"{event_type}"%', city, limit)).fetchall()
+            rows = self._fetch_dicts(query.format(city="AND favorite_city = ?"),
+                                     (event_type, event_type, city, limit))
         else:
-            rows = self.conn.execute("""
-                SELECT * FROM customers
-                WHERE (favorite_event_type = ? OR event_types LIKE ?)
-                  AND ltv_score >= 20
-                ORDER BY ltv_score DESC
-                LIMIT ?
-            """, (event_type, f'%"{event_type}"%', limit)).fetchall()
-        results = []
-        for r in rows:
-            if exclude_emails and r['email'] in exclude_emails:
-                continue
-            results.append(dict(r))
-        return results
+            rows = self._fetch_dicts(query.format(city=""), (event_type, event_type, limit))
+        if exclude_emails:
+            rows = [r for r in rows if r['email'] not in exclude_emails]
+        return rows
     # === Snapshots ===
+    # Upsert that skips unchanged rows, so the pacing_dirty triggers only
+    # fire for snapshots that actually moved
+    _SAVE_SNAPSHOT_SQL = """
+        INSERT INTO daily_snapshots
+        (event_id, snapshot_date, days_before_event, tickets_cumulative,
+         revenue_cumulative, tickets_that_day, revenue_that_day,
+         orders_that_day, sell_through_pct, ad_spend_cumulative)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(event_id, snapshot_date) DO UPDATE SET
+            days_before_event = excluded.days_before_event,
+            tickets_cumulative = excluded.tickets_cumulative,
+            revenue_cumulative = excluded.revenue_cumulative,
+            tickets_that_day = excluded.tickets_that_day,
+            revenue_that_day = excluded.revenue_that_day,
+            orders_that_day = excluded.orders_that_day,
+            sell_through_pct = excluded.sell_through_pct,
+            ad_spend_cumulative = excluded.ad_spend_cumulative
+        WHERE (days_before_event, tickets_cumulative, revenue_cumulative,
+               tickets_that_day, revenue_that_day, orders_that_day,
+               sell_through_pct, ad_spend_cumulative)
+           IS NOT (excluded.days_before_event, excluded.tickets_cumulative,
+                   excluded.revenue_cumulative, excluded.tickets_that_day,
+                   excluded.revenue_that_day, excluded.orders_that_day,
+                   excluded.sell_through_pct, excluded.ad_spend_cumulative)
+    """
     def save_snapshot(self, event_id: str, snapshot_date: str, days_before: int,
                       tickets: int, revenue: float, tickets_today: int = 0,
                       revenue_today: float = 0, orders_today: int = 0,
                       sell_through: float = 0, spend: float = 0):
-        with self.transaction() as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO daily_snapshots
-                (event_id, snapshot_date, days_before_event, tickets_cumulative,
-                 revenue_cumulative, tickets_that_day, revenue_that_day,
-                 orders_that_day, sell_through_pct, ad_spend_cumulative)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (event_id, snapshot_date, days_before, tickets, revenue,
-                  tickets_today, revenue_today, orders_today, sell_through, spend))
+        self.save_snapshots_bulk([(event_id, snapshot_date, days_before, tickets, revenue,
+                                   tickets_today, revenue_today, orders_today,
+                                   sell_through, spend)])
+    def save_snapshots_bulk(self, rows):
+        """Bulk upsert of save_snapshot() argument tuples — one transaction, one executemany."""
+        with self.bulk_txn() as cur:
+            cur.executemany(self._SAVE_SNAPSHOT_SQL, rows)
+    _SNAPSHOTS_SQL = """
+        SELECT * FROM daily_snapshots
+        WHERE event_id = ?
+        ORDER BY days_before_event DESC
+    """
     def get_snapshots(self, event_id: str) -> List[dict]:
-        rows = self.conn.execute("""
-            SELECT * FROM daily_snapshots
-            WHERE event_id = ?
-            ORDER BY days_before_event DESC
-        """, (event_id,)).fetchall()
-        return [dict(r) for r in rows]
-    def get_snapshot_at_days(self, event_id: str, days_before: int) -> Optional[dict]:
-        row = self.conn.execute("""
-            SELECT * FROM daily_snapshots
-            WHERE event_id = ? AND ABS(days_before_event - ?) <= 2
-            ORDER BY ABS(days_before_event - ?) LIMIT 1
-        """, (event_id, days_before, days_before)).fetchone()
+        return self._fetch_dicts(self._SNAPSHOTS_SQL, (event_id,))
+    def iter_snapshots(self, event_id: str):
+        """Stream get_snapshots() rows as sqlite3.Row, most recent first."""
+        return self._iter_cursor(self.conn.execute(self._SNAPSHOTS_SQL, (event_id,)))
+    def get_snapshots_bulk(self, event_ids, fields: tuple = None) -> Dict[str, List[dict]]:
+        """{event_id: get_snapshots(event_id)} for many events in one query.
+        Pass `fields` to fetch only those columns (event_id is always included)."""
+        grouped = {e: [] for e in event_ids}
+        columns = self._projection(('event_id',) + tuple(fields) if fields else None)
+        rows = self._fetch_dicts(f"""
+            SELECT {columns} FROM daily_snapshots
+            WHERE event_id IN (SELECT value FROM json_each(?))
+            ORDER BY event_id, days_before_event DESC
+        """, (_dumps(list(grouped)),))
+        for event_id, snaps in groupby(rows, key=lambda r: r['event_id']):
+            grouped[event_id] = list(snaps)
+        return grouped
+    def get_snapshot_at_days(self, event_id: str, days_before: int,
+                             fields: tuple = None) -> Optional[dict]:
+        """Snapshot nearest to days_before (within 2 days), or None.
+        Pass `fields` to fetch only those columns."""
+        row = self.conn.execute(f"""
+            SELECT {self._projection(fields)} FROM daily_snapshots
+            WHERE event_id = ? AND days_before_event BETWEEN ? AND ?
+            ORDER BY ABS(days_before_event - ?), days_before_event DESC LIMIT 1
+        """, (event_id, days_before - 2, days_before + 2, days_before)).fetchone()
         return dict(row) if row else None
+    def get_snapshots_at_days_bulk(self, event_ids, days_before: int,
+                                   fields: tuple = None) -> Dict[str, Optional[dict]]:
+        """{event_id: get_snapshot_at_days(event_id, days_before)} for many events in one query.
+        Pass `fields` to fetch only those columns (event_id is always included)."""
+        nearest = dict.fromkeys(event_ids)
+        columns = self._projection(('event_id',) + tuple(fields) if fields else None)
+        for row in self._fetch_dicts(f"""
+            SELECT {columns} FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY event_id
+                    ORDER BY ABS(days_before_event - ?), days_before_event DESC
+                ) AS closeness
+                FROM daily_snapshots
+                WHERE event_id IN (SELECT value FROM json_each(?))
+                  AND days_before_event BETWEEN ? AND ?
+            ) WHERE closeness = 1
+        """, (days_before, _dumps(list(nearest)), days_before - 2, days_before + 2)):
+            row.pop('closeness', None)
+            nearest[row['event_id']] = row
+        return nearest
     # === Pacing Curves ===
+    _SAVE_CURVE_SQL = """
+        INSERT OR REPLACE INTO pacing_curves
+        (pattern, event_type, source_events, curve_data,
+         avg_final_sell_through, sample_count, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
     def save_curve(self, pattern: str, event_type: str, source_events: List[str],
                    curve_data: dict, avg_final: float):
-        with self.transaction() as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO pacing_curves
-                (pattern, event_type, source_events, curve_data,
-                 avg_final_sell_through, sample_count, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                pattern, event_type, json.dumps(source_events),
-                json.dumps(curve_data), avg_final, len(source_events),
-                datetime.now().isoformat()
+        self.save_curves_bulk([(pattern, event_type, source_events, curve_data, avg_final)])
+    def save_curves_bulk(self, curves):
+        """Bulk save of save_curve() argument tuples — one transaction, one executemany."""
+        now = datetime.now().isoformat()
+        with self.bulk_txn() as cur:
+            cur.executemany(self._SAVE_CURVE_SQL, (
+                (pattern, event_type, _dumps(source_events), _dumps(curve_data),
+                 avg_final, len(source_events), now)
+                for pattern, event_type, source_events, curve_data, avg_final in curves
             ))
     def get_curve(self, pattern: str) -> Optional[dict]:
         row = self.conn.execute("SELECT * FROM pacing_curves WHERE pattern = ?", (pattern,)).fetchone()
-        if not row:
-            return None
+        return self._row_to_curve(row) if row else None
+    @staticmethod
+    def _row_to_curve(row) -> dict:
         return {
             'pattern': row['pattern'],
             'event_type': row['event_type'],
-            'source_events': json.loads(row['source_events']),
-            'curve_data': {int(k): v for k, v in json.loads(row['curve_data']).items()},
+            'source_events': _loads(row['source_events']),
+            'curve_data': {int(k): v for k, v in _loads(row['curve_data']).items()},
             'avg_final_sell_through': row['avg_final_sell_through'],
-            'sample_count': row['sample_count']
+            'sample_count': row['sample_count'],
+            'updated_at': row['updated_at']
         }
     def get_all_curves(self) -> List[dict]:
-        rows = self.conn.execute("SELECT pattern FROM pacing_curves").fetchall()
-        return [self.get_curve(r['pattern']) for r in rows]
+        rows = self.conn.execute("SELECT * FROM pacing_curves ORDER BY pattern").fetchall()
+        return [self._row_to_curve(r) for r in rows]
+    def count_curves(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM pacing_curves").fetchone()[0]
+    def get_dirty_pacing_events(self) -> set:
+        """Event IDs whose snapshots changed since their curves were last built."""
+        return {r[0] for r in self.conn.execute("SELECT event_id FROM pacing_dirty").fetchall()}
+    def clear_pacing_dirty(self, event_ids=None):
+        """Clear the given dirty event IDs (all of them if None)."""
+        with self.bulk_txn() as cur:
+            if event_ids is None:
+                cur.execute("DELETE FROM pacing_dirty")
+            else:
+                cur.executemany("DELETE FROM pacing_dirty WHERE event_id = ?",
+                                ((e,) for e in event_ids))
     # === Ad Spend ===
+    _SAVE_AD_SPEND_SQL = """
+        INSERT OR REPLACE INTO ad_spend
+        (event_id, campaign_id, campaign_name, spend_date, spend, impressions, clicks)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
     def save_ad_spend(self, event_id: str, campaign_id: str, campaign_name: str,
                       spend_date: str, spend: float, impressions: int = 0, clicks: int = 0):
-        with self.transaction() as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO ad_spend
-                (event_id, campaign_id, campaign_name, spend_date, spend, impressions, clicks)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (event_id, campaign_id, campaign_name, spend_date, spend, impressions, clicks))
+        self.save_ad_spend_bulk([(event_id, campaign_id, campaign_name, spend_date,
+                                  spend, impressions, clicks)])
+    def save_ad_spend_bulk(self, rows):
+        """Bulk upsert of save_ad_spend() argument tuples — one transaction, one executemany."""
+        with self.bulk_txn() as cur:
+            cur.executemany(self._SAVE_AD_SPEND_SQL, rows)
     def get_event_spend(self, event_id: str) -> float:
         row = self.conn.execute(
             "SELECT COALESCE(SUM(spend), 0) as total FROM ad_spend WHERE event_id = ?",
             (event_id,)
         ).fetchone()
         return row['total'] if row else 0
+    def get_event_spend_bulk(self, event_ids) -> Dict[str, float]:
+        """{event_id: total ad spend} for many events in one query; missing events map to 0."""
+        totals = dict.fromkeys(event_ids, 0)
+        totals.update(self.conn.execute("""
+            SELECT event_id, COALESCE(SUM(spend), 0) FROM ad_spend
+            WHERE event_id IN (SELECT value FROM json_each(?))
+            GROUP BY event_id
+        """, (_dumps(list(totals)),)).fetchall())
+        return totals
     def get_event_spend_at_days_out(self, event_id: str, days_before: int) -> float:
         """Get cumulative ad spend at a specific days-out point from snapshots."""
-        row = self.conn.execute("""
-            SELECT ad_spend_cumulative FROM daily_snapshots
-            WHERE event_id = ? AND ABS(days_before_event - ?) <= 2
-            ORDER BY ABS(days_before_event - ?) LIMIT 1
-        """, (event_id, days_before, days_before)).fetchone()
+        row = self.get_snapshot_at_days(event_id, days_before, fields=('ad_spend_cumulative',))
         return float(row['ad_spend_cumulative']) if row and row['ad_spend_cumulative'] else 0.0
     def get_event_daily_spend(self, event_id: str):
         """Get all daily spend records for an event."""
-        rows = self.conn.execute("""
+        return self._fetch_dicts("""
             SELECT spend_date, spend, campaign_name, impressions, clicks
             FROM ad_spend WHERE event_id = ?
             ORDER BY spend_date ASC
-        """, (event_id,)).fetchall()
-        return [dict(r) for r in rows]
+        """, (event_id,))
     def get_meta_sync_status(self) -> dict:
         """Get summary of Meta ad spend data in the system."""
         row = self.conn.execute("""
@@ -1193,20 +1813,45 @@ class Database:
             FROM ad_spend
         """).fetchone()
         return dict(row) if row else {}
+    def get_meta_campaigns(self, ad_account_id: str) -> Optional[list]:
+        """Cached Meta campaign list for an ad account, or None if missing or past its TTL."""
+        row = self.conn.execute("""
+            SELECT campaigns_blob FROM meta_campaigns_cache
+            WHERE ad_account_id = ? AND fetched_at + ttl_seconds > ?
+        """, (ad_account_id, int(datetime.now().timestamp()))).fetchone()
+        if not row or row['campaigns_blob'] is None:
+            return None
+        return _loads(row['campaigns_blob'])
+    def set_meta_campaigns(self, ad_account_id: str, campaigns: list, ttl: int = 3600):
+        with self.transaction() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO meta_campaigns_cache
+                (ad_account_id, campaigns_blob, fetched_at, ttl_seconds)
+                VALUES (?, ?, ?, ?)
+            """, (ad_account_id, _dumpb(campaigns), int(datetime.now().timestamp()), ttl))
 # =============================================================================
 # EVENTBRITE SYNC
 # =============================================================================
 class EventbriteSync:
     """Complete Eventbrite API integration."""
     BASE_URL = "https://www.eventbriteapi.com/v3"
+    # Order pages are network-bound; fetch this many events' orders at once
+    # (each fetch thread has its own Session, see `session`)
+    ORDER_FETCH_WORKERS = 8
     def __init__(self, api_key: str, db: Database):
         self.api_key = api_key
         self.db = db
-        self.session = requests.Session()
-        self.session.headers['Authorization'] = f'Bearer {api_key}'
+        self._local = threading.local()
         self._org_id = None
+    @property
+    def session(self):
+        """This thread's requests.Session (Sessions aren't safe to share across threads)."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = _get_requests().Session()
+            session.headers['Authorization'] = f'Bearer {self.api_key}'
+        return session
     def _get(self, endpoint: str, params: dict = None) -> dict:
-        import time
         url = f"{self.BASE_URL}{endpoint}"
         for attempt in range(3):
             try:
@@ -1218,8 +1863,8 @@ class EventbriteSync:
                     continue
                 if response.status_code != 200:
                     raise Exception(f"API error {response.status_code}: {response.text[:200]}")
-                return response.json()
-            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                return _loads(response.content)
+            except (_get_requests().exceptions.Timeout, _get_requests().exceptions.ConnectionError) as e:
                 log.warning(f"Eventbrite API error (attempt {attempt+1}/3): {e}")
                 if attempt < 2:
                     time.sleep(5 * (attempt + 1))
@@ -1249,9 +1894,14 @@ class EventbriteSync:
             raise Exception("No organizations found")
         self._org_id = orgs['organizations'][0]['id']
         return self._org_id
-    def sync_all(self, years_back: int = 2) -> dict:
-        """Sync everything: events, orders, build snapshots and customers."""
-        results = {'events': 0, 'orders': 0, 'customers': 0, 'curves': 0, 'errors': []}
+    def sync_all(self, years_back: int = 2, full_curves: bool = False) -> dict:
+        """Sync everything: events, orders, build snapshots and customers.
+
+        Pacing curves are rebuilt only for patterns with changed snapshots unless
+        full_curves=True. 'curves' is the number of stored curves afterwards and
+        'curves_rebuilt' how many this sync recomputed."""
+        results = {'events': 0, 'orders': 0, 'customers': 0, 'curves': 0, 'curves_rebuilt': 0,
+                   'errors': []}
         cutoff = datetime.now() - timedelta(days=years_back * 365)
         # Get all events
         log.info("Fetching events from Eventbrite...")
@@ -1261,6 +1911,7 @@ class EventbriteSync:
              'expand': 'venue,ticket_availability'}
         )
         log.info(f"Found {len(events)} events")
+        synced = []
         for event_data in events:
             try:
                 event = self._parse_event(event_data)
@@ -1278,26 +1929,47 @@ class EventbriteSync:
                     event['status'] = 'completed'
                 self.db.upsert_event(event)
                 results['events'] += 1
-                # Get orders
-                log.info(f"  Syncing: {event['name']}")
-                orders = self._paginate(f"/events/{event['event_id']}/orders/", {'expand': 'attendees'})
-                for order_data in orders:
-                    order = self._parse_order(order_data, event['event_id'], event_date)
-                    if order:
-                        self.db.insert_order(order)
-                        results['orders'] += 1
-                # Build snapshots for completed events
-                if event['status'] == 'completed':
-                    self._build_snapshots(event['event_id'], event_date.date(), event['capacity'])
+                synced.append((event, event_date))
             except Exception as e:
                 results['errors'].append(str(e))
                 log.error(f"  Error: {e}")
+        # Get orders: HTTP fetches run concurrently, DB writes stay on this thread in event order.
+        # At most ORDER_FETCH_WORKERS events are fetched ahead of the writer, which bounds
+        # how many events' order pages are held in memory at once.
+        with ThreadPoolExecutor(max_workers=self.ORDER_FETCH_WORKERS,
+                                thread_name_prefix='eventbrite-orders') as pool:
+            def fetch(item):
+                return item, pool.submit(self._paginate, f"/events/{item[0]['event_id']}/orders/",
+                                         {'expand': 'attendees'})
+            queued = iter(synced)
+            pending = deque(fetch(item) for item in islice(queued, self.ORDER_FETCH_WORKERS))
+            while pending:
+                (event, event_date), future = pending.popleft()
+                for item in islice(queued, 1):
+                    pending.append(fetch(item))
+                try:
+                    log.info(f"  Syncing: {event['name']}")
+                    orders = future.result()
+                    parsed = [self._parse_order(order_data, event['event_id'], event_date)
+                              for order_data in orders]
+                    parsed = [order for order in parsed if order]
+                    self.db.insert_orders(parsed)
+                    results['orders'] += len(parsed)
+                    # Build snapshots for completed events
+                    if event['status'] == 'completed':
+                        self._build_snapshots(event['event_id'], event_date.date(), event['capacity'])
+                except Exception as e:
+                    results['errors'].append(str(e))
+                    log.error(f"  Error: {e}")
         # Build customer profiles
         log.info("Building customer profiles...")
         results['customers'] = self._build_all_customers()
         # Build pacing curves
         log.info("Building pacing curves...")
-        results['curves'] = self._build_curves()
+        results['curves_rebuilt'] = self._build_curves(full=full_curves)
+        results['curves'] = self.db.count_curves()
+        # Full ingest can grow the WAL well past the autocheckpoint size
+        self.db.checkpoint()
         return results
     # Patterns that indicate non-event items (vendor fees, payment links, etc.)
     JUNK_PATTERNS = [
@@ -1306,13 +1978,11 @@ class EventbriteSync:
         'exhibitor fee', 'exhibitor registration', 'vendor app',
         'test event', 'do not use', 'draft event'
     ]
+    # All patterns in one alternation, so each name is scanned once in C
+    _JUNK_RE = re.compile('|'.join(map(re.escape, JUNK_PATTERNS)))
     def _is_junk_event(self, name: str) -> bool:
         """Filter out vendor fees, payment links, and other non-consumer events."""
-        name_lower = name.lower().strip()
-        for pattern in self.JUNK_PATTERNS:
-            if pattern in name_lower:
-                return True
-        return False
+        return self._JUNK_RE.search(name.lower()) is not None
     def _parse_event(self, data: dict) -> Optional[dict]:
         event_id = data.get('id')
         if not event_id:
@@ -1393,91 +2063,53 @@ class EventbriteSync:
                 return t
         return 'other'
     def _build_snapshots(self, event_id: str, event_date: date, capacity: int):
-        """Build daily snapshots from orders."""
-        orders = self.db.get_orders_for_event(event_id)
-        if not orders:
-            return
-        daily = defaultdict(list)
-        for o in orders:
-            try:
-                d = datetime.fromisoformat(o['order_timestamp']).date()
-                daily[d].append(o)
-            except:
-                pass
+        """Build daily snapshots from orders (daily totals are aggregated in SQL)."""
+        daily = {date.fromisoformat(d): (tickets, revenue, n)
+                 for d, tickets, revenue, n in self.db.get_daily_order_aggregates(event_id)}
         if not daily:
             return
         cumulative_tickets = 0
         cumulative_revenue = 0
         first_date = min(daily.keys())
         current = first_date
+        rows = []
         while current <= event_date:
             days_before = (event_date - current).days
-            day_orders = daily.get(current, [])
-            tickets_today = sum((o.get('ticket_count') or 1) for o in day_orders)
-            revenue_today = sum((o.get('gross_amount') or 0) for o in day_orders)
+            tickets_today, revenue_today, orders_today = daily.get(current, (0, 0, 0))
             cumulative_tickets += tickets_today
             cumulative_revenue += revenue_today
             sell_through = (cumulative_tickets / capacity * 100) if capacity > 0 else 0
-            self.db.save_snapshot(
+            rows.append((
                 event_id, current.isoformat(), days_before,
                 cumulative_tickets, cumulative_revenue,
-                tickets_today, revenue_today, len(day_orders), sell_through
-            )
+                tickets_today, revenue_today, orders_today, sell_through, 0
+            ))
             current += timedelta(days=1)
+        self.db.save_snapshots_bulk(rows)
     def _build_all_customers(self) -> int:
         """Build customer profiles from all orders."""
-        emails = self.db.get_all_emails()
         count = 0
-        # Get global stats for RFM scoring
-        all_customers_data = []
-        for email in emails:
-            orders = self.db.get_orders_for_customer(email)
-            if orders:
-                total_spent = sum(o.get('gross_amount', 0) for o in orders)
-                last_date = max(o['order_timestamp'] for o in orders)
-                try:
-                    days_since = (datetime.now() - datetime.fromisoformat(last_date)).days
-                except:
-                    days_since = 999
-                all_customers_data.append({
-                    'email': email,
-                    'orders': orders,
-                    'total_spent': total_spent,
-                    'days_since': days_since,
-                    'order_count': len(orders)
-                })
-        # Calculate RFM quintiles
-        if all_customers_data:
-            recency_values = sorted([c['days_since'] for c in all_customers_data])
-            frequency_values = sorted([c['order_count'] for c in all_customers_data])
-            monetary_values = sorted([c['total_spent'] for c in all_customers_data])
-            def get_quintile(value, sorted_list, reverse=False):
-                n = len(sorted_list)
-                if n == 0:
-                    return 3
-                idx = sorted_list.index(value) if value in sorted_list else 0
-                pct = idx / n
-                if reverse:
-                    pct = 1 - pct
-                if pct >= 0.8:
-                    return 5
-                elif pct >= 0.6:
-                    return 4
-                elif pct >= 0.4:
-                    return 3
-                elif pct >= 0.2:
-                    return 2
-                return 1
-        for c_data in all_customers_data:
-            customer = self._build_customer_profile(
-                c_data['email'], c_data['orders'],
-                get_quintile(c_data['days_since'], recency_values, reverse=True),
-                get_quintile(c_data['order_count'], frequency_values),
-                get_quintile(c_data['total_spent'], monetary_values)
-            )
+        now = datetime.now()
+        # Get global stats for RFM scoring (totals are aggregated in SQL)
+        totals = self.db.get_customer_aggregates()
+        columns = CustomerColumns()
+        for email, (n_orders, _, total_spent, _, last_date) in totals.items():
+            try:
+                days_since = (now - datetime.fromisoformat(last_date)).days
+            except:
+                days_since = 999
+            columns.append(email, days_since, n_orders, total_spent)
+        # Calculate RFM quintiles over the whole column at once
+        rfm = dict(zip(columns.emails, columns.rfm_scores()))
+        customers = []
+        for email, orders in self.db.iter_orders_by_customer():
+            rfm_r, rfm_f, rfm_m = rfm[email]
+            customer = self._build_customer_profile(email, orders, rfm_r, rfm_f, rfm_m,
+                                                    totals=totals[email], now=now)
             if customer:
-                self.db.upsert_customer(customer)
-                count += 1
+                customers.append(customer)
+        self.db.upsert_customers(customers)
+        count += len(customers)
         # After building global profiles, build event-scoped profiles
         self._build_event_profiles()
         return count
@@ -1501,8 +2133,8 @@ class EventbriteSync:
         if not rows:
             log.info("No orders with event_type/city metadata — skipping event profiles")
             return
+        now = datetime.now()
         # Group by (email, event_type, city)
-        from itertools import groupby
         keyfunc = lambda r: (r['email'], r['event_type'], r['city'])
         groups = defaultdict(list)
         for r in rows:
@@ -1513,7 +2145,7 @@ class EventbriteSync:
             total_spent = sum(o['gross_amount'] or 0 for o in orders)
             last_date = max(o['order_timestamp'] for o in orders)
             try:
-                days_since = (datetime.now() - datetime.fromisoformat(last_date)).days
+                days_since = (now - datetime.fromisoformat(last_date)).days
             except:
                 days_since = 999
             scope_stats.append({
@@ -1558,8 +2190,8 @@ class EventbriteSync:
                 'rfm_f': _quintile(s['order_count'], frequency_vals),
                 'rfm_m': _quintile(s['total_spent'], monetary_vals),
             }
-        # Build and upsert each profile
-        count = 0
+        # Build each profile, then upsert them all in one transaction
+        profiles = []
         for (email, etype, city), orders in groups.items():
             n_orders = len(orders)
             total_tickets = sum(o['ticket_count'] or 1 for o in orders)
@@ -1568,21 +2200,24 @@ class EventbriteSync:
             timestamps = [o['order_timestamp'] for o in orders]
             first_date = min(timestamps)
             last_date = max(timestamps)
+            # Parse once; rows arrive in timestamp order, so the sort is a linear check
+            try:
+                sorted_dates = [datetime.fromisoformat(t) for t in timestamps]
+                sorted_dates.sort()
+            except:
+                sorted_dates = None
             try:
-                days_since = (datetime.now() - datetime.fromisoformat(last_date)).days
+                last_dt = sorted_dates[-1] if sorted_dates else datetime.fromisoformat(last_date)
+                days_since = (now - last_dt).days
             except:
                 days_since = 0
             avg_order = total_spent / n_orders if n_orders > 0 else 0
             avg_tickets = total_tickets / n_orders if n_orders > 0 else 0
             # Days between orders (scoped)
             avg_gap = 0
-            if n_orders > 1:
-                try:
-                    sorted_dates = sorted([datetime.fromisoformat(t) for t in timestamps])
-                    gaps = [(sorted_dates[i+1] - sorted_dates[i]).days for i in range(len(sorted_dates)-1)]
-                    avg_gap = sum(gaps) / len(gaps) if gaps else 0
-                except:
-                    avg_gap = 0
+            if n_orders > 1 and sorted_dates:
+                gaps = [(b - a).days for a, b in zip(sorted_dates, sorted_dates[1:])]
+                avg_gap = sum(gaps) / len(gaps) if gaps else 0
             # Avg days before event (scoped)
             dbefore = [o['days_before_event'] for o in orders if o['days_before_event'] is not None]
             avg_days_before = sum(dbefore) / len(dbefore) if dbefore else 0
@@ -1649,7 +2284,6 @@ class EventbriteSync:
             buying_momentum = 'new'
             if n_orders >= 2 and avg_gap > 0:
                 try:
-                    sorted_dates = sorted([datetime.fromisoformat(t) for t in timestamps])
                     if len(sorted_dates) >= 2:
                         last_gap = (sorted_dates[-1] - sorted_dates[-2]).days
                         if last_gap < avg_gap * 0.7:
@@ -1668,7 +2302,7 @@ class EventbriteSync:
                 buying_momentum = 'dormant'
 
             # 5. Purchase velocity: orders per year
-            tenure_days = (datetime.now() - datetime.fromisoformat(first_date)).days if first_date else 1
+            tenure_days = (now - datetime.fromisoformat(first_date)).days if first_date else 1
             purchase_velocity = min(12, (n_orders / (tenure_days / 365)) if tenure_days > 0 else 0)
 
             # 6. Upgrade likelihood: based on last order vs average
@@ -1688,7 +2322,7 @@ class EventbriteSync:
             elif avg_tickets < 5.5: group_size_segment = 'small_group'
             else: group_size_segment = 'large_group'
 
-            self.db.upsert_event_profile({
+            profiles.append({
                 'email': email, 'event_type': etype, 'city': city,
                 'orders_in_scope': n_orders, 'tickets_in_scope': total_tickets,
                 'spent_in_scope': total_spent, 'events_in_scope': len(event_ids),
@@ -1713,25 +2347,38 @@ class EventbriteSync:
                 'daypart_preference': daypart_preference,
                 'group_size_segment': group_size_segment,
             })
-            count += 1
+        self.db.upsert_event_profiles(profiles)
+        count = len(profiles)
         log.info(f"Built {count} event-scoped customer profiles across {len(set((e,c) for (_, e, c) in groups.keys()))} scopes")
 
     def _build_customer_profile(self, email: str, orders: List[dict],
-                                 rfm_r: int, rfm_f: int, rfm_m: int) -> Optional[Customer]:
+                                 rfm_r: int, rfm_f: int, rfm_m: int,
+                                 totals: Optional[tuple] = None,
+                                 now: datetime = None) -> Optional[Customer]:
+        """totals: (orders, tickets, spent, first_ts, last_ts) from
+        Database.get_customer_aggregates(); computed from orders when omitted.
+        now: reference time for recency/tenure, shared across a build."""
         if not orders:
             return None
-        total_orders = len(orders)
-        total_tickets = sum(o.get('ticket_count', 1) for o in orders)
-        total_spent = sum(o.get('gross_amount', 0) for o in orders)
-        # Dates
+        now = now or datetime.now()
         timestamps = [o['order_timestamp'] for o in orders]
-        first_date = min(timestamps)
-        last_date = max(timestamps)
+        if totals is None:
+            totals = (len(orders), sum(o.get('ticket_count', 1) for o in orders),
+                      sum(o.get('gross_amount', 0) for o in orders),
+                      min(timestamps), max(timestamps))
+        total_orders, total_tickets, total_spent, first_date, last_date = totals
+        # Dates: parse each timestamp once. Orders arrive newest-first, so the
+        # reversed list is already ascending and the sort is a linear check.
+        try:
+            parsed = [datetime.fromisoformat(t) for t in reversed(timestamps)]
+            parsed.sort()
+        except:
+            parsed = None
         try:
-            first_dt = datetime.fromisoformat(first_date)
-            last_dt = datetime.fromisoformat(last_date)
-            days_since = (datetime.now() - last_dt).days
-            tenure = (datetime.now() - first_dt).days
+            first_dt = parsed[0] if parsed else datetime.fromisoformat(first_date)
+            last_dt = parsed[-1] if parsed else datetime.fromisoformat(last_date)
+            days_since = (now - last_dt).days
+            tenure = (now - first_dt).days
         except:
             days_since = 0
             tenure = 0
@@ -1739,31 +2386,31 @@ class EventbriteSync:
         avg_order = total_spent / total_orders if total_orders > 0 else 0
         avg_tickets = total_tickets / total_orders if total_orders > 0 else 0
         # Days between orders
-        if total_orders > 1:
-            try:
-                sorted_dates = sorted([datetime.fromisoformat(t) for t in timestamps])
-                gaps = [(sorted_dates[i+1] - sorted_dates[i]).days for i in range(len(sorted_dates)-1)]
-                avg_gap = sum(gaps) / len(gaps) if gaps else 0
-            except:
-                avg_gap = 0
+        if total_orders > 1 and parsed:
+            gaps = [(b - a).days for a, b in zip(parsed, parsed[1:])]
+            avg_gap = sum(gaps) / len(gaps) if gaps else 0
         else:
             avg_gap = 0
-        # Event preferences
-        event_types = defaultdict(int)
-        cities = defaultdict(int)
+        # Event preferences, with favorites tracked while tallying
+        event_types = {}
+        cities = {}
+        favorite_type = favorite_city = None
         events_attended = []
+        events_seen = set()
         days_before_list = []
         for o in orders:
             if o.get('event_type'):
-                event_types[o['event_type']] += 1
+                favorite_type = _tally(event_types, _intern(o['event_type']), favorite_type)
             if o.get('city'):
-                cities[o['city']] += 1
-            if o.get('event_name') and o['event_name'] not in events_attended:
-                events_attended.append(o['event_name'])
+                favorite_city = _tally(cities, _intern(o['city']), favorite_city)
+            name = o.get('event_name')
+            if name and name not in events_seen:
+                events_seen.add(name)
+                events_attended.append(name)
             if o.get('days_before_event') is not None:
                 days_before_list.append(o['days_before_event'])
-        favorite_type = max(event_types, key=event_types.get) if event_types else ''
-        favorite_city = max(cities, key=cities.get) if cities else ''
+        favorite_type = favorite_type or ''
+        favorite_city = favorite_city or ''
         # Timing segment
         avg_days_before = sum(days_before_list) / len(days_before_list) if days_before_list else 0
         if avg_days_before >= 45:
@@ -1818,7 +2465,7 @@ class EventbriteSync:
             favorite_city=favorite_city,
             event_types=dict(event_types),
             cities=dict(cities),
-            events_attended=events_attended,
+            events_attended=tuple(events_attended),
             timing_segment=timing,
             rfm_recency=rfm_r,
             rfm_frequency=rfm_f,
@@ -1827,15 +2474,32 @@ class EventbriteSync:
             ltv_score=ltv_score,
             ltv_projected=ltv_projected
         )
-    def _build_curves(self) -> int:
-        """Build pacing curves from completed events."""
+    def _build_curves(self, full: bool = False) -> int:
+        """Build pacing curves from completed events.
+
+        Incremental unless full=True: only patterns with an event in pacing_dirty
+        (snapshots added or changed since the last build) are recomputed. With no
+        curves stored yet the build is always full."""
+        if not full and not self.db.count_curves():
+            full = True
+        dirty = None if full else self.db.get_dirty_pacing_events()
+        if dirty is not None and not dirty:
+            return 0
         events = self.db.get_past_events()
         # Group by pattern
         patterns = defaultdict(list)
         for e in events:
             pattern = self._get_pattern(e['name'])
             patterns[pattern].append(e)
-        curves_built = 0
+        if dirty is not None:
+            patterns = {p: evs for p, evs in patterns.items()
+                        if any(e['event_id'] in dirty for e in evs)}
+        # Fetch snapshots and final ticket counts for every event up front
+        event_ids = [e['event_id'] for evs in patterns.values() for e in evs]
+        snapshots_by_event = self.db.get_snapshots_bulk(
+            event_ids, fields=('days_before_event', 'sell_through_pct'))
+        tickets_by_event = self.db.get_event_tickets_bulk(event_ids)
+        curves = []
         for pattern, pattern_events in patterns.items():
             if len(pattern_events) < 1:
                 continue
@@ -1844,13 +2508,13 @@ class EventbriteSync:
             source_events = []
             final_sell_throughs = []
             for event in pattern_events:
-                snapshots = self.db.get_snapshots(event['event_id'])
+                snapshots = snapshots_by_event[event['event_id']]
                 if not snapshots:
                     continue
                 source_events.append(event['name'])
                 # Get final sell-through
                 if event['capacity'] > 0:
-                    final_tickets = self.db.get_event_tickets(event['event_id'])
+                    final_tickets = tickets_by_event[event['event_id']]
                     final_sell_throughs.append(final_tickets / event['capacity'] * 100)
                 for snap in snapshots:
                     days = snap['days_before_event']
@@ -1861,21 +2525,23 @@ class EventbriteSync:
             # Calculate curve
             curve_data = {}
             for days, values in all_points.items():
-                values_sorted = sorted(values)
-                n = len(values_sorted)
+                # Each bucket list is built for this curve only, so sort it in place
+                values.sort()
+                n = len(values)
                 curve_data[days] = {
-                    'median': values_sorted[n // 2],
-                    'p25': values_sorted[max(0, n // 4 - 1)] if n >= 4 else values_sorted[0],
-                    'p75': values_sorted[min(n - 1, 3 * n // 4)] if n >= 4 else values_sorted[-1],
+                    'median': values[n // 2],
+                    'p25': values[max(0, n // 4 - 1)] if n >= 4 else values[0],
+                    'p75': values[min(n - 1, 3 * n // 4)] if n >= 4 else values[-1],
                     'samples': n
                 }
             avg_final = statistics.mean(final_sell_throughs) if final_sell_throughs else 0
-            self.db.save_curve(
+            curves.append((
                 pattern, pattern_events[0].get('event_type', 'other'),
                 source_events, curve_data, avg_final
-            )
-            curves_built += 1
-        return curves_built
+            ))
+        self.db.save_curves_bulk(curves)
+        self.db.clear_pacing_dirty(dirty)
+        return len(curves)
     def _get_pattern(self, name: str) -> str:
         """Extract pattern from event name, resolving aliases."""
         p = _normalize_event_pattern(name, include_season=True)
@@ -1922,45 +2588,147 @@ class MetaAdsSync:
         'pwfs': ['philly wine fest spring'],
         'pwff': ['philly wine fest fall'],
     }
+    # Events synced concurrently by sync_all_events (network-bound)
+    SYNC_WORKERS = 8
+    # Meta rate-limits per app and ad account, so every MetaAdsSync in the
+    # process shares one pool of in-flight request slots and one resume time
+    MAX_CONCURRENT_REQUESTS = SYNC_WORKERS
+    _request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+    _resume_lock = threading.Lock()
+    _resume_at = 0.0   # time.monotonic() before which no request is sent
+    # Hold off once X-Business-Use-Case-Usage reports this percent of any quota
+    USAGE_PAUSE_PCT = 90
+    # Cap on computed backoff; an explicit Retry-After may ask for longer
+    MAX_BACKOFF = 30
+    # Longest process-wide pause any single response (Retry-After or usage header) can impose
+    MAX_PAUSE = MAX_BACKOFF * 10
 
     def __init__(self, access_token: str, ad_account_id: str, db: Database):
         self.access_token = access_token
         self.ad_account_id = ad_account_id.replace('act_', '')
         self.db = db
-        self.session = requests.Session()
-        self.session.headers['Authorization'] = f'Bearer {access_token}'
+        self._local = threading.local()
+        # Per-sync memo: the account's campaign list is crawled once, and each
+        # distinct event name is matched against it once
+        self._campaigns = None
+        self._campaign_matches: Dict[str, list] = {}
+    @property
+    def session(self):
+        """This thread's requests.Session (Sessions aren't safe to share across threads)."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = _get_requests().Session()
+            session.headers['Authorization'] = f'Bearer {self.access_token}'
+        return session
     def _api_get(self, url: str, params: dict = None):
         """Make GET request with retry/backoff for rate limits."""
-        import time
         params = params or {}
         params['access_token'] = self.access_token
+        return self._api_request(self.session.get, url, params=params, timeout=30)
+
+    def _api_post(self, url: str, data: dict):
+        """Make POST request with the same retry/backoff as _api_get."""
+        data = dict(data, access_token=self.access_token)
+        return self._api_request(self.session.post, url, data=data, timeout=60)
+
+    def _api_request(self, send, url: str, **kwargs):
+        """send(url, **kwargs) with retries, sharing rate-limit state process-wide.
+
+        At most MAX_CONCURRENT_REQUESTS requests are in flight at once. A 429,
+        or usage past USAGE_PAUSE_PCT, pushes back _resume_at for every thread."""
         for attempt in range(3):
             try:
-                resp = self.session.get(url, params=params, timeout=30)
+                self._wait_for_resume()
+                with self._request_slots:
+                    resp = send(url, **kwargs)
                 if resp.status_code == 429:
-                    wait = int(resp.headers.get('Retry-After', 60 * (attempt + 1)))
+                    wait = (self._retry_after(resp.headers.get('Retry-After'))
+                            or min(5 * 2 ** attempt, self.MAX_BACKOFF))
                     log.warning(f"Meta API rate limited, waiting {wait}s")
-                    time.sleep(wait)
+                    self._pause(wait)
                     continue
                 resp.raise_for_status()
-                return resp.json()
+                wait = self._usage_pause(resp.headers.get('X-Business-Use-Case-Usage'))
+                if wait:
+                    log.warning(f"Meta API usage near its limit, pausing {wait}s")
+                    self._pause(wait)
+                return _loads(resp.content)
             except Exception as e:
                 log.error(f"Meta API error (attempt {attempt+1}): {e}")
                 if attempt < 2:
-                    time.sleep(2 ** attempt)
+                    time.sleep(min(2 ** attempt, self.MAX_BACKOFF))
         return None
 
+    @classmethod
+    def _pause(cls, seconds: float):
+        with cls._resume_lock:
+            cls._resume_at = max(cls._resume_at, time.monotonic() + seconds)
+
+    @classmethod
+    def _wait_for_resume(cls):
+        delay = cls._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    @classmethod
+    def _retry_after(cls, header: Optional[str]) -> float:
+        """Seconds asked for by a Retry-After header, in delta-seconds or HTTP-date
+        form, capped at MAX_PAUSE (0 if missing or unparseable)."""
+        if not header:
+            return 0
+        try:
+            wait = float(header)
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(header)
+            except (TypeError, ValueError):
+                return 0
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            wait = (when - datetime.now(timezone.utc)).total_seconds()
+        return min(max(wait, 0), cls.MAX_PAUSE)
+
+    @classmethod
+    def _usage_pause(cls, header: Optional[str]) -> int:
+        """Seconds to hold off given an X-Business-Use-Case-Usage header (0 if under
+        the limit), capped at MAX_PAUSE.
+
+        The header maps business ids to lists of {call_count, total_cputime,
+        total_time (percent of quota), estimated_time_to_regain_access (minutes)}."""
+        if not header:
+            return 0
+        try:
+            wait = 0
+            for entries in _loads(header).values():
+                for usage in entries:
+                    pct = max(usage.get('call_count', 0), usage.get('total_cputime', 0),
+                              usage.get('total_time', 0))
+                    if pct >= cls.USAGE_PAUSE_PCT:
+                        regain = usage.get('estimated_time_to_regain_access') or 0
+                        wait = max(wait, regain * 60 or cls.MAX_BACKOFF)
+            return min(wait, cls.MAX_PAUSE)
+        except (ValueError, AttributeError, TypeError):
+            return 0
+
+    def _matching_aliases(self, event_lower: str) -> Dict[str, str]:
+        """{alias: first of its patterns that matches this (lowercased) event name}."""
+        matches = {}
+        for alias, patterns in self.EVENT_ALIASES.items():
+            for pattern in patterns:
+                if pattern in event_lower or event_lower in pattern:
+                    matches[alias] = pattern
+                    break
+        return matches
+
     def _generate_keywords(self, event_name: str):
         """Generate search keywords from event name for campaign matching.
 
         Includes: full name, bigrams, auto-abbreviations, and alias lookups
         so campaigns named 'DBF Winter' match 'District Beer Fest: Winter'.
         """
-        cleaned = re.sub(r'\b20\d{2}\b', '', event_name)
-        for word in ['spring edition', 'fall edition', 'summer edition', 'winter edition',
-                      'edition', 'spring', 'fall', 'summer', 'winter']:
-            cleaned = re.sub(r'\b' + word + r'\b', '', cleaned, flags=re.IGNORECASE)
-        cleaned = re.sub(r'[^\w\s]', '', cleaned)
+        cleaned = _RE_KW_YEAR.sub('', event_name)
+        cleaned = _RE_KW_SEASON.sub('', cleaned)
+        cleaned = _RE_PUNCT.sub('', cleaned)
         cleaned = ' '.join(cleaned.split()).strip().lower()
         if not cleaned:
             return []
@@ -1986,28 +2754,61 @@ class MetaAdsSync:
 
         # Check alias map: find aliases whose event patterns match this event name
         event_lower = event_name.lower()
-        for alias, patterns in self.EVENT_ALIASES.items():
-            for pattern in patterns:
-                if pattern in event_lower or event_lower in pattern:
-                    keywords.append(alias)
-                    break
+        keywords.extend(self._matching_aliases(event_lower))
 
         # Reverse alias lookup: check if any alias IS in the event name
         # (handles cases where we're searching from the campaign side)
+        event_squashed = event_lower.replace(' ', '')
         for alias, patterns in self.EVENT_ALIASES.items():
-            if alias in event_lower.replace(' ', ''):
-                for pattern in patterns:
-                    if pattern not in keywords:
-                        keywords.append(pattern)
+            if alias in event_squashed:
+                keywords.extend(patterns)
 
         # Deduplicate while preserving order
-        seen = set()
-        unique = []
-        for kw in keywords:
-            if kw not in seen:
-                seen.add(kw)
-                unique.append(kw)
-        return unique
+        return list(dict.fromkeys(keywords))
+
+    # How long a crawled campaign list is reused from meta_campaigns_cache
+    CAMPAIGNS_TTL = 3600
+    def _list_campaigns(self) -> List[dict]:
+        """All campaigns in the ad account, paginated once per MetaAdsSync instance
+        and reused across runs from meta_campaigns_cache for CAMPAIGNS_TTL seconds.
+
+        Each campaign also carries 'lower_name' and 'name_words' (punctuation
+        stripped), computed once here rather than per event matched against it.
+        A crawl cut short by an API error is kept for this instance (so later
+        lookups don't re-crawl a rate-limited account) but not cached."""
+        if self._campaigns is not None:
+            return self._campaigns
+        campaigns = self.db.get_meta_campaigns(self.ad_account_id)
+        if campaigns is None:
+            url = f"{self.BASE_URL}/act_{self.ad_account_id}/campaigns"
+            params = {'fields': 'id,name,status,objective', 'limit': 200}
+            campaigns = []
+            complete = True
+            while url:
+                data = self._api_get(url, params)
+                if not data:
+                    complete = False
+                    log.warning(f"Meta campaign crawl stopped early; matching against {len(campaigns)} campaigns")
+                    break
+                campaigns.extend(data.get('data', []))
+                paging = data.get('paging', {})
+                next_url = paging.get('next')
+                if next_url:
+                    url = next_url
+                    params = {}
+                else:
+                    break
+            if complete:
+                self.db.set_meta_campaigns(self.ad_account_id, campaigns, ttl=self.CAMPAIGNS_TTL)
+        self._campaigns = self._annotate_campaigns(campaigns)
+        return self._campaigns
+    @staticmethod
+    def _annotate_campaigns(campaigns: List[dict]) -> List[dict]:
+        for campaign in campaigns:
+            lower = (campaign.get('name') or '').lower()
+            campaign['lower_name'] = lower
+            campaign['name_words'] = _RE_PUNCT.sub('', lower).split()
+        return campaigns
 
     def _find_campaigns(self, event_name: str):
         """Find Meta campaigns matching an event name.
@@ -2016,70 +2817,61 @@ class MetaAdsSync:
         1. Forward match: event keywords found in campaign name
         2. Reverse alias match: campaign name words that are known aliases for this event
         """
+        if event_name in self._campaign_matches:
+            return self._campaign_matches[event_name]
         keywords = self._generate_keywords(event_name)
         if not keywords:
             return []
-        url = f"{self.BASE_URL}/act_{self.ad_account_id}/campaigns"
-        params = {'fields': 'id,name,status,objective', 'limit': 200}
+        # Per-event matchers, built once and reused for every campaign name:
+        # all keywords as one alternation, and the aliases that point at this event
+        keyword_re = re.compile('|'.join(map(re.escape, keywords)))
+        event_aliases = self._matching_aliases(event_name.lower())
         matched = []
         seen_ids = set()
-        event_lower = event_name.lower()
-        while url:
-            data = self._api_get(url, params)
-            if not data:
-                break
-            for campaign in data.get('data', []):
-                if campaign['id'] in seen_ids:
-                    continue
-                cname = campaign['name'].lower()
-                match_reason = None
-                # Forward match: check if any event keyword appears in campaign name
-                for kw in keywords:
-                    if kw in cname:
-                        match_reason = f"keyword '{kw}'"
+        for campaign in self._list_campaigns():
+            if campaign['id'] in seen_ids:
+                continue
+            match_reason = None
+            # Forward match: check if any event keyword appears in campaign name
+            m = keyword_re.search(campaign['lower_name'])
+            if m:
+                match_reason = f"keyword '{m.group(0)}'"
+            # Reverse alias match: check if any word in campaign name is an alias for this event
+            elif event_aliases:
+                for word in campaign['name_words']:
+                    if word in event_aliases:
+                        match_reason = f"reverse alias '{word}'->'{event_aliases[word]}'"
                         break
-                # Reverse alias match: check if any word in campaign name is a known alias
-                if not match_reason:
-                    cname_clean = re.sub(r'[^\w\s]', '', cname)
-                    for word in cname_clean.split():
-                        if word in self.EVENT_ALIASES:
-                            for pattern in self.EVENT_ALIASES[word]:
-                                if pattern in event_lower or event_lower in pattern:
-                                    match_reason = f"reverse alias '{word}'->'{pattern}'"
-                                    break
-                            if match_reason:
-                                break
-                if match_reason:
-                    matched.append({'id': campaign['id'], 'name': campaign['name'],
-                                    'status': campaign.get('status')})
-                    seen_ids.add(campaign['id'])
-                    log.info(f"  Matched campaign '{campaign['name']}' via {match_reason}")
-            paging = data.get('paging', {})
-            next_url = paging.get('next')
-            if next_url:
-                url = next_url
-                params = {}
-            else:
-                break
-        log.info(f"Found {len(matched)} Meta campaigns for '{event_name}' (keywords: {keywords[:5]})")
+            if match_reason:
+                matched.append({'id': campaign['id'], 'name': campaign['name'],
+                                'status': campaign.get('status')})
+                seen_ids.add(campaign['id'])
+                log.info("  Matched campaign '%s' via %s", campaign['name'], match_reason)
+        self._campaign_matches[event_name] = matched
+        log.info("Found %d Meta campaigns for '%s' (keywords: %s)", len(matched), event_name, keywords[:5])
         return matched
 
-    def _fetch_daily_insights(self, campaign_id: str, date_start: str, date_stop: str):
-        """Fetch daily spend insights for a campaign."""
-        url = f"{self.BASE_URL}/{campaign_id}/insights"
-        params = {
+    @staticmethod
+    def _insights_params(date_start: str, date_stop: str) -> dict:
+        return {
             'fields': 'spend,impressions,clicks,date_start,date_stop',
             'time_increment': '1',
             'date_start': date_start,
             'date_stop': date_stop,
             'limit': 500
         }
-        insights = []
+    def _fetch_daily_insights(self, campaign_id: str, date_start: str, date_stop: str):
+        """Fetch daily spend insights for a campaign."""
+        return self._follow_pages(f"{self.BASE_URL}/{campaign_id}/insights",
+                                  self._insights_params(date_start, date_stop))
+    def _follow_pages(self, url: str, params: dict, rows: list = None) -> list:
+        """Collect 'data' rows from url and every paging.next after it."""
+        rows = [] if rows is None else rows
         while url:
             data = self._api_get(url, params)
             if not data:
                 break
-            insights.extend(data.get('data', []))
+            rows.extend(data.get('data', []))
             paging = data.get('paging', {})
             next_url = paging.get('next')
             if next_url:
@@ -2087,34 +2879,78 @@ class MetaAdsSync:
                 params = {}
             else:
                 break
-        return insights
-    def sync_event_spend(self, event_id: str, event_name: str, event_date_str: str):
-        """Sync ad spend from Meta for a single event."""
+        return rows
+    # Graph API limit on sub-requests per batch call
+    INSIGHTS_BATCH_SIZE = 50
+    def _batch_fetch_insights(self, reqs) -> Dict[tuple, list]:
+        """Daily insights for many (campaign_id, date_start, date_stop) requests.
+
+        Sends Graph API batch calls of up to INSIGHTS_BATCH_SIZE sub-requests and
+        returns {request tuple: rows}. Later pages are followed with _api_get, and
+        any sub-request that fails falls back to _fetch_daily_insights."""
+        reqs = list(dict.fromkeys(reqs))
+        results = {}
+        for i in range(0, len(reqs), self.INSIGHTS_BATCH_SIZE):
+            chunk = reqs[i:i + self.INSIGHTS_BATCH_SIZE]
+            batch = [{'method': 'GET',
+                      'relative_url': f"{cid}/insights?{urlencode(self._insights_params(start, stop))}"}
+                     for cid, start, stop in chunk]
+            responses = self._api_post(f"{self.BASE_URL}/", {'batch': _dumps(batch)})
+            if not isinstance(responses, list):
+                responses = [None] * len(chunk)
+            for req, sub in zip(chunk, responses):
+                data = None
+                if sub and sub.get('code') == 200:
+                    try:
+                        data = _loads(sub.get('body') or '')
+                    except ValueError:
+                        data = None
+                if not isinstance(data, dict):
+                    results[req] = self._fetch_daily_insights(*req)
+                    continue
+                next_url = data.get('paging', {}).get('next')
+                rows = list(data.get('data', []))
+                results[req] = self._follow_pages(next_url, {}, rows) if next_url else rows
+        return results
+    @staticmethod
+    def _spend_window(event_date_str: str) -> Tuple[str, str]:
+        """(date_start, date_stop) of the ad spend pulled for an event."""
+        event_date = datetime.fromisoformat(event_date_str).date()
+        date_start = (event_date - timedelta(days=300)).isoformat()
+        date_stop = min(event_date, date.today()).isoformat()
+        return date_start, date_stop
+    def sync_event_spend(self, event_id: str, event_name: str, event_date_str: str,
+                         insights_by_req: Dict[tuple, list] = None):
+        """Sync ad spend from Meta for a single event.
+
+        insights_by_req: prefetched _batch_fetch_insights() results; campaigns
+        missing from it are fetched here in one batch."""
         try:
-            event_date = datetime.fromisoformat(event_date_str).date()
-            today = date.today()
-            date_start = (event_date - timedelta(days=300)).isoformat()
-            date_stop = min(event_date, today).isoformat()
+            date_start, date_stop = self._spend_window(event_date_str)
             campaigns = self._find_campaigns(event_name)
             if not campaigns:
                 return {'event_id': event_id, 'total_spend': 0, 'campaigns_found': 0, 'days_of_data': 0}
+            reqs = [(c['id'], date_start, date_stop) for c in campaigns]
+            insights_by_req = insights_by_req or {}
+            missing = [r for r in reqs if r not in insights_by_req]
+            if missing:
+                insights_by_req = {**insights_by_req, **self._batch_fetch_insights(missing)}
             total_spend = 0.0
             total_days = 0
-            for campaign in campaigns:
-                insights = self._fetch_daily_insights(campaign['id'], date_start, date_stop)
+            rows = []
+            for campaign, req in zip(campaigns, reqs):
+                insights = insights_by_req[req]
                 for day_data in insights:
                     spend = float(day_data.get('spend', 0))
                     impressions = int(day_data.get('impressions', 0))
                     clicks = int(day_data.get('clicks', 0))
                     spend_date = day_data.get('date_start', '')
-                    self.db.save_ad_spend(
-                        event_id=event_id, campaign_id=campaign['id'],
-                        campaign_name=campaign['name'], spend_date=spend_date,
-                        spend=spend, impressions=impressions, clicks=clicks
-                    )
+                    rows.append((event_id, campaign['id'], campaign['name'],
+                                 spend_date, spend, impressions, clicks))
                     total_spend += spend
                 total_days += len(insights)
-            log.info(f"Meta sync for {event_name}: ${total_spend:.2f} across {len(campaigns)} campaigns")
+            self.db.save_ad_spend_bulk(rows)
+            log.info("Meta sync for %s: $%.2f across %d campaigns", event_name, total_spend, len(campaigns))
             return {'event_id': event_id, 'total_spend': round(total_spend, 2),
                     'campaigns_found': len(campaigns), 'days_of_data': total_days}
         except Exception as e:
@@ -2124,8 +2960,26 @@ class MetaAdsSync:
     def sync_all_events(self, events_list):
         """Sync Meta ad spend for all events."""
         results = {'total_events': len(events_list), 'successful': 0, 'total_spend': 0.0, 'event_results': []}
+        # Crawl the account's campaigns once up front; every event is matched locally
+        self._list_campaigns()
+        # Then fetch insights for every matched (campaign, window) in shared batch calls
+        reqs = []
         for event in events_list:
-            result = self.sync_event_spend(event['event_id'], event['name'], event['event_date'])
+            try:
+                date_start, date_stop = self._spend_window(event['event_date'])
+                reqs.extend((c['id'], date_start, date_stop)
+                            for c in self._find_campaigns(event['name']))
+            except Exception:
+                pass  # sync_event_spend reports it for this event
+        insights_by_req = self._batch_fetch_insights(reqs)
+        # Per-event fallback fetches and writes run concurrently; results keep event order
+        with ThreadPoolExecutor(max_workers=self.SYNC_WORKERS,
+                                thread_name_prefix='meta-sync') as pool:
+            event_results = list(pool.map(
+                lambda e: self.sync_event_spend(e['event_id'], e['name'], e['event_date'],
+                                                insights_by_req=insights_by_req),
+                events_list))
+        for result in event_results:
             results['event_results'].append(result)
             results['total_spend'] += result.get('total_spend', 0)
             if not result.get('error'):
@@ -2142,7 +2996,12 @@ class DecisionEngine:
         self._curves = {}
         self._load_curves()
         self._all_events_cache = None
+        self._events_by_pattern_cache = None
         self._pattern_cache = {}
+        self._history_cache = {}
+        self._past_by_year_cache = {}
+        self._audience_count_cache = {}
+        self._date_cache: Dict[str, date] = {}
     def _load_curves(self):
         curves = self.db.get_all_curves()
         for c in curves:
@@ -2154,22 +3013,100 @@ class DecisionEngine:
             p = _normalize_event_pattern(name, include_season=True)
             self._pattern_cache[name] = PATTERN_ALIASES.get(p, p)
         return self._pattern_cache[name]
+    def _event_date(self, event_date: str) -> date:
+        """Calendar date of an event_date string (its YYYY-MM-DD prefix), parsed once per string."""
+        d = self._date_cache.get(event_date)
+        if d is None:
+            d = self._date_cache[event_date] = date.fromisoformat(event_date[:10])
+        return d
     def _get_all_events(self) -> list:
         """Get all events (cached per portfolio run)."""
         if self._all_events_cache is None:
             self._all_events_cache = self.db.get_events(upcoming_only=False)
         return self._all_events_cache
+    def _events_by_pattern(self) -> Dict[str, List[dict]]:
+        """{pattern: events} over all events, in event_date order (cached per portfolio run)."""
+        if self._events_by_pattern_cache is None:
+            by_pattern = defaultdict(list)
+            for e in self._get_all_events():
+                by_pattern[self._get_pattern(e['name'])].append(e)
+            self._events_by_pattern_cache = dict(by_pattern)
+        return self._events_by_pattern_cache
+    def _pattern_history(self, pattern: str) -> List[dict]:
+        """Past editions of a pattern with their final totals (cached per portfolio run).
+
+        Every upcoming event that shares a pattern compares against the same editions,
+        so the lookup and the per-edition totals are done once per pattern.
+        """
+        history = self._history_cache.get(pattern)
+        if history is None:
+            today = date.today()
+            editions = []
+            for pe in self._events_by_pattern().get(pattern, ()):
+                pe_date = self._event_date(pe['event_date'])
+                if pe_date > today:
+                    continue
+                editions.append((pe, pe_date))
+            ids = [pe['event_id'] for pe, _ in editions]
+            tickets = self.db.get_event_tickets_bulk(ids)
+            revenue = self.db.get_event_revenue_bulk(ids)
+            spend = self.db.get_event_spend_bulk(ids)
+            history = [{
+                'event': pe,
+                'date': pe_date,
+                'tickets': tickets[pe['event_id']],
+                'revenue': revenue[pe['event_id']],
+                'spend': spend[pe['event_id']],
+            } for pe, pe_date in editions]
+            self._history_cache[pattern] = history
+        return history
+    def _past_by_year(self, pattern: str, current_ids) -> Dict[int, List[dict]]:
+        """{year: events} for a pattern's editions outside the current group (cached per portfolio run).
+
+        Every day of a timed-entry group compares against the same other editions."""
+        current_ids = frozenset(current_ids)
+        past_by_year = self._past_by_year_cache.get((pattern, current_ids))
+        if past_by_year is None:
+            past_by_year = defaultdict(list)
+            for pe in self._events_by_pattern().get(pattern, ()):
+                if pe['event_id'] not in current_ids:
+                    past_by_year[self._event_date(pe['event_date']).year].append(pe)
+            past_by_year = self._past_by_year_cache[(pattern, current_ids)] = dict(past_by_year)
+        return past_by_year
+    def _audience_count(self, key: tuple, count) -> int:
+        """count() for a targeting audience, once per distinct key (cached per portfolio run)."""
+        if key not in self._audience_count_cache:
+            self._audience_count_cache[key] = count()
+        return self._audience_count_cache[key]
     def _invalidate_cache(self):
-        """Clear caches at start of portfolio analysis."""
+        """Clear the per-run caches (events, pattern history, audience counts)."""
         self._all_events_cache = None
+        self._events_by_pattern_cache = None
         self._pattern_cache = {}
-    def analyze_event(self, event_id: str) -> Optional[EventPacing]:
+        self._history_cache = {}
+        self._past_by_year_cache = {}
+        self._audience_count_cache = {}
+    @contextmanager
+    def _analysis_run(self):
+        """Scope the per-run caches to one analyze_portfolio/analyze_event call, so a
+        direct analyze_event never serves totals or counts left by an earlier run."""
+        self._invalidate_cache()
+        try:
+            yield
+        finally:
+            self._invalidate_cache()
+    def analyze_event(self, event_id: str, event: dict = None) -> Optional[EventPacing]:
         """Ticket-count based analysis. Compares raw tickets sold at N days out
-        against historical ticket counts at the same days-out for past editions."""
-        event = self.db.get_event(event_id)
+        against historical ticket counts at the same days-out for past editions.
+        Pass the already-loaded `event` row to skip re-reading it."""
+        with self._analysis_run():
+            return self._analyze_event(event_id, event)
+    def _analyze_event(self, event_id: str, event: dict = None) -> Optional[EventPacing]:
+        """analyze_event against the current run's caches."""
+        event = event or self.db.get_event(event_id)
         if not event:
             return None
-        event_date = datetime.fromisoformat(event['event_date']).date()
+        event_date = self._event_date(event['event_date'])
         days_until = (event_date - date.today()).days
         tickets = self.db.get_event_tickets(event_id)
         revenue = self.db.get_event_revenue(event_id)
@@ -2179,26 +3116,26 @@ class DecisionEngine:
         cac = spend / tickets if tickets > 0 else 0
         # --- Find all past editions of this event pattern ---
         pattern = self._get_pattern(event['name'])
-        all_events = self._get_all_events()
         historical_comparisons = []
         hist_tickets_at_point = []
         comparison_events = []
         comparison_years = []
-        for pe in all_events:
-            if pe['event_id'] == event_id:
-                continue
-            if self._get_pattern(pe['name']) != pattern:
-                continue
-            pe_date = datetime.fromisoformat(pe['event_date']).date()
-            if pe_date > date.today():
-                continue
-            pe_tickets = self.db.get_event_tickets(pe['event_id'])
-            pe_revenue = self.db.get_event_revenue(pe['event_id'])
+        history = [past for past in self._pattern_history(pattern)
+                   if past['event']['event_id'] != event_id]
+        snaps = self.db.get_snapshots_at_days_bulk(
+            [past['event']['event_id'] for past in history], days_until,
+            fields=('days_before_event', 'tickets_cumulative', 'revenue_cumulative',
+                    'sell_through_pct', 'ad_spend_cumulative'))
+        for past in history:
+            pe = past['event']
+            pe_date = past['date']
+            pe_tickets = past['tickets']
+            pe_revenue = past['revenue']
             pe_capacity = pe.get('capacity', 0)
-            pe_spend_total = self.db.get_event_spend(pe['event_id'])
+            pe_spend_total = past['spend']
             comparison_events.append(pe['name'])
             comparison_years.append(pe_date.year)
-            snap = self.db.get_snapshot_at_days(pe['event_id'], days_until)
+            snap = snaps[pe['event_id']]
             snap_tickets = snap['tickets_cumulative'] if snap else None
             comp = {
                 'event_name': pe['name'],
@@ -2230,11 +3167,7 @@ class DecisionEngine:
         hist_hi = 0
         pace = 0
         if hist_tickets_at_point:
-            sorted_tix = sorted(hist_tickets_at_point)
-            n = len(sorted_tix)
-            hist_median = sorted_tix[n // 2]
-            hist_lo = sorted_tix[0]
-            hist_hi = sorted_tix[-1]
+            hist_median, hist_lo, hist_hi = _median_range(hist_tickets_at_point)
             if hist_median > 0:
                 pace = round(((tickets - hist_median) / hist_median) * 100, 1)
         # --- Projection from ticket ratios ---
@@ -2258,10 +3191,13 @@ class DecisionEngine:
             tickets, pace, cac, days_until, hist_median, comparison_events
         )
         # Targeting
-        high_value = len(self.db.get_high_value_customers(
-            event_type=event.get('event_type'), city=event.get('city'), min_ltv=50, limit=1000
-        ))
-        at_risk = len(self.db.get_at_risk_customers(min_orders=2, min_days_inactive=180))
+        high_value = self._audience_count(
+            ('high_value', event.get('event_type'), event.get('city')),
+            lambda: self.db.count_high_value_customers(
+                event_type=event.get('event_type'), city=event.get('city'), min_ltv=50, limit=1000))
+        at_risk = self._audience_count(
+            ('at_risk',),
+            lambda: self.db.count_at_risk_customers(min_orders=2, min_days_inactive=180))
         return EventPacing(
             event_id=event_id, event_name=event['name'],
             event_date=event['event_date'], days_until=days_until,
@@ -2371,27 +3307,24 @@ class DecisionEngine:
         for pattern, group in by_pattern.items():
             if len(group) < 2:
                 continue
-            dates = [datetime.fromisoformat(a.event_date).date() for a in group]
+            dates = [self._event_date(a.event_date) for a in group]
             if 0 < (max(dates) - min(dates)).days <= 3:
                 result[pattern] = group
         return result
     def _create_day_event(self, pattern, day_analyses, all_analyses_for_pattern):
         """Combine multiple time-slot EventPacing objects for same day into one."""
-        import hashlib
-        first_date = datetime.fromisoformat(day_analyses[0].event_date).date()
+        first_date = self._event_date(day_analyses[0].event_date)
         day_name = first_date.strftime("%A")
         names = [a.event_name for a in all_analyses_for_pattern]
         base_name = names[0]
         if len(names) > 1:
-            prefix = names[0]
-            for n in names[1:]:
-                while not n.startswith(prefix):
-                    prefix = prefix[:-1]
-            prefix = prefix.rstrip(" -:/")
+            prefix = os.path.commonprefix(names).rstrip(" -:/")
             if len(prefix) > 10:
                 base_name = prefix
         logical_name = f"{base_name} - {day_name}"
-        eid = hashlib.md5(f"{logical_name}_{first_date}".encode()).hexdigest()
+        # md5 kept so grouped-event ids stay stable for dashboard links and API
+        # lookups; usedforsecurity=False lets it run on FIPS-restricted builds
+        eid = hashlib.md5(f"{logical_name}_{first_date}".encode(), usedforsecurity=False).hexdigest()
         total_tickets = sum(a.tickets_sold for a in day_analyses)
         total_revenue = sum(a.revenue for a in day_analyses)
         # Sum capacities across sessions (not max) - each timed slot is separate capacity
@@ -2414,40 +3347,38 @@ class DecisionEngine:
         # Figure out which "day ordinal" this grouped day is within the multi-day event
         # e.g., for a Sat/Sun event, Saturday=Day 1, Sunday=Day 2
         all_current_dates = sorted(set(
-            datetime.fromisoformat(a.event_date).date() for a in all_analyses_for_pattern
+            self._event_date(a.event_date) for a in all_analyses_for_pattern
         ))
         current_day_ordinal = all_current_dates.index(first_date) if first_date in all_current_dates else 0
         total_current_days = len(all_current_dates)
 
         historical_comparisons = []
-        all_events = self._get_all_events()
         # Group ALL past events by (year) first, then by sorted date within that year
-        past_by_year = defaultdict(list)
-        for pe in all_events:
-            if self._get_pattern(pe['name']) != pattern:
-                continue
-            pe_date = datetime.fromisoformat(pe['event_date']).date()
-            is_current = any(pe['event_id'] == a.event_id for a in all_analyses_for_pattern)
-            if is_current:
-                continue
-            past_by_year[pe_date.year].append(pe)
+        past_by_year = self._past_by_year(pattern, [a.event_id for a in all_analyses_for_pattern])
         # For each past year, sort dates and match by day ordinal position
         past_by_date = {}
         for year, year_events in past_by_year.items():
-            year_dates = sorted(set(datetime.fromisoformat(e['event_date']).date() for e in year_events))
+            year_dates = sorted(set(self._event_date(e['event_date']) for e in year_events))
             # Match current day ordinal to past year's day ordinal
             if current_day_ordinal < len(year_dates):
                 target_date = year_dates[current_day_ordinal]
                 matching_events = [e for e in year_events
-                                   if datetime.fromisoformat(e['event_date']).date() == target_date]
+                                   if self._event_date(e['event_date']) == target_date]
                 if matching_events:
                     past_by_date[(year, target_date)] = matching_events
             elif len(year_dates) == 1 and total_current_days > 1 and current_day_ordinal == 0:
                 # Past edition was single-day, current is multi-day: only compare with Day 1
                 target_date = year_dates[0]
                 past_by_date[(year, target_date)] = [e for e in year_events
-                    if datetime.fromisoformat(e['event_date']).date() == target_date]
+                    if self._event_date(e['event_date']) == target_date]
 
+        past_ids = [pe['event_id'] for events_on_date in past_by_date.values() for pe in events_on_date]
+        past_tickets = self.db.get_event_tickets_bulk(past_ids)
+        past_revenue = self.db.get_event_revenue_bulk(past_ids)
+        past_spend = self.db.get_event_spend_bulk(past_ids)
+        past_snaps = self.db.get_snapshots_at_days_bulk(
+            past_ids, days_until,
+            fields=('tickets_cumulative', 'revenue_cumulative', 'ad_spend_cumulative'))
         for (year, pdate), events_on_date in past_by_date.items():
             pd_weekday = pdate.strftime("%A")
             date_tickets = 0
@@ -2455,10 +3386,10 @@ class DecisionEngine:
             date_capacity = 0
             date_spend = 0
             for pe in events_on_date:
-                t = self.db.get_event_tickets(pe['event_id'])
-                r = self.db.get_event_revenue(pe['event_id'])
+                t = past_tickets[pe['event_id']]
+                r = past_revenue[pe['event_id']]
                 c = pe.get('capacity', 0)
-                sp = self.db.get_event_spend(pe['event_id'])
+                sp = past_spend[pe['event_id']]
                 date_tickets += t
                 date_revenue += r
                 date_capacity += c  # Sum capacities across sessions (not max)
@@ -2469,7 +3400,7 @@ class DecisionEngine:
             snap_spend = 0
             snap_found = False
             for pe in events_on_date:
-                s = self.db.get_snapshot_at_days(pe['event_id'], days_until)
+                s = past_snaps[pe['event_id']]
                 if s:
                     snap_tickets += s['tickets_cumulative']
                     snap_revenue += s['revenue_cumulative']
@@ -2519,11 +3450,8 @@ class DecisionEngine:
         grouped_hist_hi = 0
         comps_with_snap = [c for c in historical_comparisons if c.get('at_days_out')]
         if comps_with_snap:
-            snap_tix = sorted([c['at_days_out']['tickets'] for c in comps_with_snap])
-            n = len(snap_tix)
-            grouped_hist_median = snap_tix[n // 2]
-            grouped_hist_lo = snap_tix[0]
-            grouped_hist_hi = snap_tix[-1]
+            grouped_hist_median, grouped_hist_lo, grouped_hist_hi = _median_range(
+                c['at_days_out']['tickets'] for c in comps_with_snap)
         # Calculate actual pace for grouped event based on ticket counts
         grouped_pace = 0
         if grouped_hist_median > 0:
@@ -2557,44 +3485,47 @@ class DecisionEngine:
         )
     def analyze_portfolio(self) -> List[EventPacing]:
         """Analyze all upcoming events, grouping timed-entry events by day."""
-        self._invalidate_cache()
-        events = self.db.get_events(upcoming_only=True)
-        analyses = []
-        for event in events:
-            analysis = self.analyze_event(event['event_id'])
-            if analysis:
-                analyses.append(analysis)
-        timed_groups = self._detect_timed_entry_groups(analyses)
-        if timed_groups:
-            grouped_ids = set()
-            for pattern, group in timed_groups.items():
-                for a in group:
-                    grouped_ids.add(a.event_id)
-            ungrouped = [a for a in analyses if a.event_id not in grouped_ids]
-            for pattern, group in timed_groups.items():
-                if pattern in MULTI_DAY_COMBINE:
-                    # Combine ALL days into ONE event instead of splitting by day
-                    combined = self._create_day_event(pattern, group, group)
-                    fixed_name = combined.event_name.rsplit(' - ', 1)[0] if ' - ' in combined.event_name else combined.event_name
-                    combined.event_name = fixed_name
-                    ungrouped.append(combined)
-                else:
-                    by_date = defaultdict(list)
+        with self._analysis_run():
+            # Same rows as get_events(upcoming_only=True), taken from the cached full list
+            today = date.today().isoformat()
+            events = [e for e in self._get_all_events() if (e['event_date'] or '') >= today]
+            analyses = []
+            for event in events:
+                analysis = self._analyze_event(event['event_id'], event=event)
+                if analysis:
+                    analyses.append(analysis)
+            timed_groups = self._detect_timed_entry_groups(analyses)
+            if timed_groups:
+                grouped_ids = set()
+                for pattern, group in timed_groups.items():
                     for a in group:
-                        d = datetime.fromisoformat(a.event_date).date()
-                        by_date[d].append(a)
-                    for date, day_group in by_date.items():
-                        day_event = self._create_day_event(pattern, day_group, group)
-                        ungrouped.append(day_event)
-            analyses = ungrouped
-        analyses.sort(key=lambda x: (-x.urgency, x.days_until))
-        return analyses
+                        grouped_ids.add(a.event_id)
+                ungrouped = [a for a in analyses if a.event_id not in grouped_ids]
+                for pattern, group in timed_groups.items():
+                    if pattern in MULTI_DAY_COMBINE:
+                        # Combine ALL days into ONE event instead of splitting by day
+                        combined = self._create_day_event(pattern, group, group)
+                        fixed_name = combined.event_name.rsplit(' - ', 1)[0] if ' - ' in combined.event_name else combined.event_name
+                        combined.event_name = fixed_name
+                        ungrouped.append(combined)
+                    else:
+                        by_date = defaultdict(list)
+                        for a in group:
+                            d = self._event_date(a.event_date)
+                            by_date[d].append(a)
+                        for day, day_group in by_date.items():
+                            day_event = self._create_day_event(pattern, day_group, group)
+                            ungrouped.append(day_event)
+                analyses = ungrouped
+            analyses.sort(key=lambda x: (-x.urgency, x.days_until))
+            return analyses
 # =============================================================================
 # FLASK API
 # =============================================================================
-def create_app(db: Database, auto_sync: bool = False) -> Flask:
+def create_app(db: Database, auto_sync: bool = False) -> 'Flask':
     """Create Flask app with all endpoints."""
-    import threading
+    from flask import Flask, jsonify, request
+    from flask_cors import CORS
     app = Flask(__name__)
     CORS(app)
     engine = DecisionEngine(db)
@@ -2603,14 +3534,13 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
     _portfolio_cache = {'analyses': None, 'ts': 0}  # Cache portfolio analysis for 60s
     def _get_portfolio():
         """Get cached portfolio analysis (avoids re-analyzing on every targeting request)."""
-        import time
         now = time.time()
         if _portfolio_cache['analyses'] is None or (now - _portfolio_cache['ts']) > 60:
             _portfolio_cache['analyses'] = engine.analyze_portfolio()
             _portfolio_cache['ts'] = now
         return _portfolio_cache['analyses']
-    def _do_background_sync():
-        """Run Eventbrite sync in background thread."""
+    def _do_background_sync(full_curves: bool = False):
+        """Run Eventbrite sync in background thread (full_curves rebuilds every pacing curve)."""
         _sync_state['running'] = True
         try:
             api_key = os.environ.get('EVENTBRITE_API_KEY')
@@ -2620,14 +3550,14 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                 return
             log.info("Starting Eventbrite sync...")
             eb = EventbriteSync(api_key, db)
-            result = eb.sync_all(years_back=4)
+            result = eb.sync_all(years_back=4, full_curves=full_curves)
             _sync_state['result'] = result
             # Reload decision engine curves after sync
             engine._load_curves()
             log.info(f"Sync complete: {result.get('events', 0)} events, "
                      f"{result.get('orders', 0)} orders, "
                      f"{result.get('customers', 0)} customers, "
-                     f"{result.get('curves', 0)} curves")
+                     f"{result.get('curves', 0)} curves ({result.get('curves_rebuilt', 0)} rebuilt)")
             # Also sync Meta ad spend if credentials are configured
             meta_token = os.environ.get('META_ACCESS_TOKEN')
             meta_accounts_str = os.environ.get('META_AD_ACCOUNT_ID', '')
@@ -2647,6 +3577,9 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                     log.info(f"Meta sync complete: ${total_meta_spend:.2f} total across {len(meta_accounts)} account(s)")
                 except Exception as me:
                     log.error(f"Meta sync error: {me}")
+            # Drop analyses cached before the new orders and spend landed
+            engine._invalidate_cache()
+            _portfolio_cache['analyses'] = None
             # Check for milestones and generate auto-exports
             _check_milestones_and_export()
             # Check and send alerts
@@ -2659,7 +3592,6 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
             _sync_state['running'] = False
     def _schedule_recurring_sync():
         """Recurring sync every 6 hours (or custom interval from env)."""
-        import time
         SYNC_INTERVAL = int(os.environ.get('SYNC_INTERVAL_HOURS', 6)) * 3600
         while True:
             time.sleep(SYNC_INTERVAL)
@@ -2705,7 +3637,7 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                                     elif day_threshold == 30:
                                         past_attendees = db.get_past_attendees_not_purchased(
                                             event['event_id'], event['name'], limit=5000,
-                                            current_buyer_emails=set(db.get_event_purchasers(event['event_id']))
+                                            current_buyer_emails=set(db.iter_event_purchasers(event['event_id']))
                                         )
                                         audience = past_attendees
                                     elif day_threshold == 14:
@@ -2716,13 +3648,12 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                                         audience = db.get_event_profiles(et, ec, timing_segment='last_minute')
                                     # Store export record
                                     audience_emails = [a.get('email') for a in audience]
-                                    db.conn.execute("""
+                                    db.execute_write("""
                                         INSERT INTO auto_exports
                                         (event_id, milestone, export_type, audience_count, audience_emails, created_at)
                                         VALUES (?, ?, ?, ?, ?, ?)
                                     """, (event['event_id'], milestone_name, export_type, len(audience),
-                                          json.dumps(audience_emails), datetime.now().isoformat()))
-                                    db.conn.commit()
+                                          _dumps(audience_emails), datetime.now().isoformat()))
                                     log.info(f"Auto-export created: {event['name']} {milestone_name} ({len(audience)} audience)")
                 except Exception as e:
                     log.warning(f"Error processing event {event.get('event_id')}: {e}")
@@ -2752,11 +3683,10 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                 server.login(smtp_user, smtp_pass)
                 server.sendmail(smtp_user, alert_to.split(','), msg.as_string())
             # Log the alert
-            db.conn.execute("""
+            db.execute_write("""
                 INSERT INTO alert_log (alert_type, event_id, message, sent_at, sent_to)
                 VALUES (?, ?, ?, ?, ?)
             """, (alert_type, event_id, message, datetime.now().isoformat(), alert_to))
-            db.conn.commit()
             log.info(f"Alert sent: {alert_type} to {alert_to}")
         except Exception as e:
             log.error(f"Alert email error: {e}")
@@ -2781,8 +3711,7 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
             for export in recent_exports:
                 msg = f"New export created: {export['event_id']} {export['milestone']} ({export['audience_count']} audience)"
                 _send_alert_email('NEW_EXPORT', msg, export['event_id'])
-                db.conn.execute("UPDATE auto_exports SET sent_notified = 1 WHERE id = ?", (export['id'],))
-                db.conn.commit()
+                db.execute_write("UPDATE auto_exports SET sent_notified = 1 WHERE id = ?", (export['id'],))
         except Exception as e:
             log.error(f"Alert check error: {e}")
 
@@ -2793,10 +3722,10 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
 
     def _serialize_pacing(obj):
         """Convert EventPacing dataclass to JSON-safe dict."""
-        d = asdict(obj)
+        d = pacing_to_dict(obj)
         # Convert Decision enum to its string value
         if 'decision' in d:
-            d['decision'] = obj.decision.value
+            d['decision'] = _DECISION_STR[obj.decision]
         return d
     @app.route('/')
     def home():
@@ -2827,7 +3756,7 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
         })
     @app.route('/api/sync')
     def sync_endpoint():
-        """Trigger Eventbrite sync (runs in background)."""
+        """Trigger Eventbrite sync (runs in background). ?full=1 rebuilds every pacing curve."""
         if _sync_state['running']:
             return jsonify({'status': 'already_running', 'message': 'Sync is already in progress'})
         api_key = os.environ.get('EVENTBRITE_API_KEY')
@@ -2838,7 +3767,8 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
         _sync_state['running'] = False
         _sync_state['result'] = None
         _sync_state['error'] = None
-        threading.Thread(target=_do_background_sync, daemon=True).start()
+        full_curves = request.args.get('full', '').lower() in ('1', 'true', 'yes')
+        threading.Thread(target=_do_background_sync, args=(full_curves,), daemon=True).start()
         return jsonify({'status': 'started', 'message': 'Sync started in background. Poll /api/sync-status for progress.'})
     @app.route('/api/meta-sync')
     def meta_sync_endpoint():
@@ -2859,6 +3789,8 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                     meta = MetaAdsSync(meta_token, acct_id, db)
                     result = meta.sync_all_events(all_events)
                     log.info(f"Manual Meta sync complete for {acct_id}: {result}")
+                engine._invalidate_cache()
+                _portfolio_cache['analyses'] = None
             except Exception as e:
                 log.error(f"Manual Meta sync error: {e}")
         threading.Thread(target=_do_meta_sync, daemon=True).start()
@@ -2972,27 +3904,18 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
         if not export:
             return jsonify({'error': 'Export not found'}), 404
         # Reconstruct audience from stored emails
-        audience_emails = json.loads(export['audience_emails'] or '[]')
-        output = io.StringIO()
+        audience_emails = _loads(export['audience_emails'] or '[]')
         fields = ['email', 'favorite_city', 'favorite_event_type', 'rfm_segment',
                   'total_orders', 'total_events', 'total_spent', 'ltv_score']
-        writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
-        writer.writeheader()
-        for email in audience_emails[:1000]:  # Limit to 1000 rows per file
-            customer = db.get_customer(email)
-            if customer:
-                writer.writerow({
-                    'email': customer.email,
-                    'favorite_city': customer.favorite_city,
-                    'favorite_event_type': customer.favorite_event_type,
-                    'rfm_segment': customer.rfm_segment,
-                    'total_orders': customer.total_orders,
-                    'total_events': customer.total_events_attended,
-                    'total_spent': round(customer.total_spent, 2),
-                    'ltv_score': round(customer.ltv_score, 1),
-                })
-        output.seek(0)
-        return output.getvalue(), 200, {
+        def rows():
+            for email in audience_emails[:1000]:  # Limit to 1000 rows per file
+                customer = db.get_customer(email)
+                if customer:
+                    yield (customer.email, customer.favorite_city, customer.favorite_event_type,
+                           customer.rfm_segment, customer.total_orders,
+                           customer.total_events_attended, round(customer.total_spent, 2),
+                           round(customer.ltv_score, 1))
+        return _iter_csv(fields, rows()), 200, {
             'Content-Disposition': f'attachment; filename="auto_export_{export_id}_{export["milestone"]}.csv"',
             'Content-Type': 'text/csv'
         }
@@ -3014,7 +3937,6 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
     @app.route('/api/dashboard')
     def dashboard():
         """Complete dashboard data."""
-        import time
         analyses = engine.analyze_portfolio()
         # Populate cache so targeting/export endpoints don't re-analyze
         _portfolio_cache['analyses'] = analyses
@@ -3027,7 +3949,7 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
         # Decision counts
         decisions = {}
         for a in analyses:
-            d = a.decision.value
+            d = _DECISION_STR[a.decision]
             decisions[d] = decisions.get(d, 0) + 1
         # Customer stats
         segments = db.get_segment_counts()
@@ -3097,7 +4019,7 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
             return jsonify({'error': 'Customer not found'}), 404
         orders = db.get_orders_for_customer(email)
         return jsonify({
-            'customer': asdict(customer),
+            'customer': customer_to_dict(customer),
             'orders': orders
         })
     @app.route('/api/customers/segments')
@@ -3531,10 +4453,9 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                 exclude_emails=current_buyers,
                 limit=500
             )
-        cross_sell_by_type = defaultdict(int)
+        cross_sell_by_type = Counter()
         for c in cross_sell:
-            for t in c.get('attended_types', []):
-                cross_sell_by_type[t] += 1
+            cross_sell_by_type.update(c.get('attended_types', ()))
 
         # ---- 2. SELL-THROUGH VELOCITY & GAP-CLOSING PLAN ----
         pattern = engine._get_pattern(pattern_name)
@@ -3542,14 +4463,12 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
         # Calculate sell velocity (tickets per day over last 7 days)
         recent_velocity = 0
         for eid in all_sibling_ids:
-            snaps = db.get_snapshots(eid)
-            if len(snaps) >= 2:
-                # Snapshots are ordered by days_before DESC, so first entries are most recent
-                recent = [s for s in snaps if s['days_before_event'] <= days_until + 7]
-                if len(recent) >= 2:
-                    tickets_diff = recent[0]['tickets_cumulative'] - recent[-1]['tickets_cumulative']
-                    days_diff = max(1, len(recent))
-                    recent_velocity += tickets_diff / days_diff
+            # Snapshots are ordered by days_before DESC, so first entries are most recent
+            recent = [s for s in db.iter_snapshots(eid) if s['days_before_event'] <= days_until + 7]
+            if len(recent) >= 2:
+                tickets_diff = recent[0]['tickets_cumulative'] - recent[-1]['tickets_cumulative']
+                days_diff = max(1, len(recent))
+                recent_velocity += tickets_diff / days_diff
         tickets_gap = max(0, capacity - current_tickets)
         days_to_sell = int(tickets_gap / recent_velocity) if recent_velocity > 0 else 999
         # Build gap-closing action plan
@@ -3614,8 +4533,7 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
         # For past editions: how quickly do multi-event buyers purchase after attending?
         post_event_velocity = []
         if past_event_ids:
-            ph = ','.join(['?' for _ in past_event_ids])
-            rows = db.conn.execute(f"""
+            rows = db.conn.execute("""
                 SELECT o1.email,
                        o1.order_timestamp as first_purchase,
                        o2.order_timestamp as next_purchase,
@@ -3625,11 +4543,11 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                 FROM orders o1
                 JOIN orders o2 ON o1.email = o2.email AND o2.order_timestamp > o1.order_timestamp
                 JOIN events e2 ON o2.event_id = e2.event_id
-                WHERE o1.event_id IN ({ph})
-                  AND o2.event_id NOT IN ({ph})
+                WHERE o1.event_id IN (SELECT value FROM json_each(?))
+                  AND o2.event_id NOT IN (SELECT value FROM json_each(?))
                 ORDER BY days_gap ASC
                 LIMIT 5000
-            """, past_event_ids + past_event_ids).fetchall()
+            """, (_dumps(past_event_ids),) * 2).fetchall()
             # Bucket by timing
             buckets = {'0-7': 0, '8-14': 0, '15-30': 0, '31-60': 0, '61-90': 0, '90+': 0}
             gaps = []
@@ -3685,7 +4603,7 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                    AVG(CASE WHEN o.promo_code IS NOT NULL AND o.promo_code != '' THEN o.gross_amount END) as avg_promo_price,
                    AVG(CASE WHEN o.promo_code IS NULL OR o.promo_code = '' THEN o.gross_amount END) as avg_full_price
             FROM orders o
-            JOIN customers c ON lower(o.email) = c.email
+            JOIN customers c ON o.email = c.email
             WHERE c.rfm_segment IS NOT NULL AND c.rfm_segment != ''
             GROUP BY c.rfm_segment
         """).fetchall()
@@ -3999,19 +4917,14 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
         elif audience == 'group_buyers':
             if _et and _ec:
                 customers_list = db.get_event_profiles(_et, _ec, group_size='large_group')
-        # Build CSV
-        output = io.StringIO()
+        # Build CSV (streamed)
         fields = ['email', 'favorite_city', 'favorite_event_type', 'rfm_segment',
                   'total_orders', 'total_events', 'total_spent', 'ltv_score',
                   'days_since_last', 'avg_tickets_per_order',
                   'buying_momentum', 'price_sensitivity', 'social_influence_score',
                   'group_size_segment', 'purchase_velocity', 'cross_event_affinity']
-        writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
-        writer.writeheader()
-        for c in customers_list:
-            writer.writerow(c)
         from flask import Response
-        csv_data = output.getvalue()
+        csv_data = _iter_csv(fields, (tuple(c.get(f, '') for f in fields) for c in customers_list))
         safe_name = re.sub(r'[^a-zA-Z0-9]', '_', event.get('name', 'event'))
         filename = f"{safe_name}_{audience}.csv"
         return Response(
@@ -4106,7 +5019,8 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                 exclude_event_ids=list(set(all_sibling_ids)))
             exclude = {c['email'] for c in past}
             exclude.update(current_buyers)
-            customers_list = db.get_city_prospects(event.get('city', ''), exclude_emails=exclude, limit=10000)
+            customers_list = db.get_city_prospects(event.get('city', ''), exclude_emails=exclude, limit=10000,
+                                                   fields=CUSTOMER_EXPORT_FIELDS)
         elif audience == 'type_fans':
             past = db.get_past_attendees_not_purchased(
                 event_id, pattern_name, limit=10000,
@@ -4114,19 +5028,17 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                 exclude_event_ids=list(set(all_sibling_ids)))
             exclude = {c['email'] for c in past}
             exclude.update(current_buyers)
-            city_p = db.get_city_prospects(event.get('city', ''), exclude_emails=exclude, limit=10000)
+            city_p = db.get_city_prospects(event.get('city', ''), exclude_emails=exclude, limit=10000,
+                                           fields=('email',))
             exclude.update({c['email'] for c in city_p})
-            customers_list = db.get_type_prospects(event.get('event_type', ''), city=event.get('city', ''), exclude_emails=exclude, limit=10000)
+            customers_list = db.get_type_prospects(event.get('event_type', ''), city=event.get('city', ''), exclude_emails=exclude, limit=10000,
+                                                   fields=CUSTOMER_EXPORT_FIELDS)
         elif audience == 'at_risk':
-            at_risk = db.get_at_risk_customers(min_orders=2, min_days_inactive=180)
-            for c in at_risk:
-                if c['email'] in current_buyers:
-                    continue
-                ecities = c.get('cities', '{}')
-                etypes = c.get('event_types', '{}')
-                if not (_json_key_match(ecities, event.get('city')) and _json_key_match(etypes, event.get('event_type'))):
-                    continue
-                customers_list.append(c)
+            if event.get('event_type') and event.get('city'):
+                at_risk = db.get_at_risk_customers(min_orders=2, min_days_inactive=180,
+                                                   event_type=event['event_type'], city=event['city'],
+                                                   match_any=False)
+                customers_list = [c for c in at_risk if c['email'] not in current_buyers]
         elif audience == 'all':
             past = db.get_past_attendees_not_purchased(
                 event_id, pattern_name, limit=10000,
@@ -4136,31 +5048,24 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
             seen.update(current_buyers)
             customers_list.extend(past)
             if event.get('city'):
-                city_p = db.get_city_prospects(event['city'], exclude_emails=seen, limit=10000)
+                city_p = db.get_city_prospects(event['city'], exclude_emails=seen, limit=10000,
+                                               fields=CUSTOMER_EXPORT_FIELDS)
                 customers_list.extend(city_p)
                 seen.update({c['email'] for c in city_p})
             if event.get('event_type'):
-                type_p = db.get_type_prospects(event['event_type'], city=event.get('city', ''), exclude_emails=seen, limit=10000)
+                type_p = db.get_type_prospects(event['event_type'], city=event.get('city', ''), exclude_emails=seen, limit=10000,
+                                               fields=CUSTOMER_EXPORT_FIELDS)
                 customers_list.extend(type_p)
                 seen.update({c['email'] for c in type_p})
-            at_risk = db.get_at_risk_customers(min_orders=2, min_days_inactive=180)
-            for c in at_risk:
-                if c['email'] not in seen:
-                    ecities = c.get('cities', '{}')
-                    etypes = c.get('event_types', '{}')
-                    if _json_key_match(ecities, event.get('city')) and _json_key_match(etypes, event.get('event_type')):
-                        customers_list.append(c)
-        # Build CSV
-        output = io.StringIO()
-        fields = ['email', 'favorite_city', 'favorite_event_type', 'rfm_segment',
-                  'total_orders', 'total_events', 'total_spent', 'ltv_score',
-                  'days_since_last', 'last_order_date']
-        writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
-        writer.writeheader()
-        for c in customers_list:
-            writer.writerow(c)
+            if event.get('event_type') and event.get('city'):
+                at_risk = db.get_at_risk_customers(min_orders=2, min_days_inactive=180,
+                                                   event_type=event['event_type'], city=event['city'],
+                                                   match_any=False)
+                customers_list.extend(c for c in at_risk if c['email'] not in seen)
+        # Build CSV (streamed)
+        fields = CUSTOMER_EXPORT_FIELDS
         from flask import Response
-        csv_data = output.getvalue()
+        csv_data = _iter_csv(fields, (tuple(c.get(f, '') for f in fields) for c in customers_list))
         safe_name = re.sub(r'[^a-zA-Z0-9]', '_', event['name'])
         filename = f"{safe_name}_{audience}.csv"
         return Response(
@@ -4217,10 +5122,9 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
         # Build email sets for each edition
         edition_list = []
         for ekey, ed in editions.items():
-            placeholders = ','.join(['?'] * len(ed['event_ids']))
             rows = db.conn.execute(
-                f"SELECT DISTINCT email FROM orders WHERE event_id IN ({placeholders})",
-                ed['event_ids']
+                "SELECT DISTINCT email FROM orders WHERE event_id IN (SELECT value FROM json_each(?))",
+                (_dumps(list(ed['event_ids'])),)
             ).fetchall()
             emails = set(r['email'] for r in rows)
             if len(emails) < 5:
@@ -4614,7 +5518,7 @@ def create_app(db: Database, auto_sync: bool = False) -> Flask:
                 'hist_median': round(a.historical_median_at_point, 2),
                 'hist_range': [round(a.historical_range[0], 2), round(a.historical_range[1], 2)],
                 'pace_vs_hist': round(a.pace_vs_historical, 2),
-                'decision': a.decision.value,
+                'decision': _DECISION_STR[a.decision],
                 'urgency': a.urgency,
                 'rationale': a.rationale,
                 'comparison_count': len(a.comparison_events) if a.comparison_events else 0,
@@ -4678,15 +5582,15 @@ class CraftDominant:
         self.db = Database(db_path)
         self.engine = DecisionEngine(self.db)
         self._eventbrite = None
-    def sync(self, api_key: str, years_back: int = 2) -> dict:
+    def sync(self, api_key: str, years_back: int = 2, full_curves: bool = False) -> dict:
         """Sync everything from Eventbrite."""
-        if not requests:
+        if not HAS_REQUESTS:
             return {'error': 'requests library not installed'}
         eb = EventbriteSync(api_key, self.db)
-        return eb.sync_all(years_back)
+        return eb.sync_all(years_back, full_curves=full_curves)
     def sync_meta(self, access_token: str, ad_account_id: str) -> dict:
         """Sync ad spend from Meta Marketing API."""
-        if not requests:
+        if not HAS_REQUESTS:
             return {'error': 'requests library not installed'}
         meta = MetaAdsSync(access_token, ad_account_id, self.db)
         all_events = self.db.get_events(upcoming_only=False)
@@ -4733,7 +5637,7 @@ class CraftDominant:
         # Decisions
         decisions = {}
         for a in analyses:
-            d = a.decision.value
+            d = _DECISION_STR[a.decision]
             decisions[d] = decisions.get(d, 0) + 1
         print(f"\nDECISIONS")
         for d, count in decisions.items():
@@ -4742,7 +5646,7 @@ class CraftDominant:
         print(f"\nEVENTS")
         print("-" * 70)
         for a in analyses:
-            print(f"\n[{a.decision.value.upper()}] {a.event_name}")
+            print(f"\n[{_DECISION_STR[a.decision].upper()}] {a.event_name}")
             print(f"   {a.event_date[:10]} ({a.days_until}d) | {a.tickets_sold:,}/{a.capacity:,} ({a.sell_through:.1f}%)")
             if a.historical_median_at_point > 0:
                 print(f"   Historical: {a.historical_median_at_point:.1f}% | Pace: {a.pace_vs_historical:+.0f}%")
@@ -4774,6 +5678,7 @@ CRAFT DOMINANT - Unified Intelligence System
 Commands:
     sync <api_key>       Sync all data from Eventbrite (events, orders, customers)
     sync <key> --years N Sync N years of history (default: 2)
+    sync <key> --full    Also rebuild every pacing curve (not just changed ones)
     report               Print portfolio analysis report
     serve                Start API server for dashboard
     customer <email>     Show customer detail
@@ -4788,7 +5693,7 @@ Then:
     craft = CraftDominant()
     if cmd == 'sync':
         if len(sys.argv) < 3:
-            print("Usage: sync <eventbrite_api_key> [--years N]")
+            print("Usage: sync <eventbrite_api_key> [--years N] [--full]")
             return
         api_key = sys.argv[2]
         years = 2
@@ -4798,11 +5703,11 @@ Then:
             except:
                 pass
         print(f"\nSyncing {years} years of data from Eventbrite...\n")
-        result = craft.sync(api_key, years)
+        result = craft.sync(api_key, years, full_curves='--full' in sys.argv)
         print(f"\nEvents: {result.get('events', 0)}")
         print(f"Orders: {result.get('orders', 0)}")
         print(f"Customers: {result.get('customers', 0)}")
-        print(f"Pacing curves: {result.get('curves', 0)}")
+        print(f"Pacing curves: {result.get('curves', 0)} ({result.get('curves_rebuilt', 0)} rebuilt)")
         if result.get('errors'):
             print(f"\nErrors: {len(result['errors'])}")
     elif cmd == 'report':
@@ -4834,8 +5739,17 @@ Then:
 # =============================================================================
 # MODULE-LEVEL APP FOR GUNICORN
 # =============================================================================
-# gunicorn craft_unified:app will use this.
+# gunicorn craft_unified:app will use this. The app is built on first access
+# (PEP 562 module __getattr__), so importing this module for the CLI, main.py or
+# scripts doesn't import Flask, open the database or start the sync threads.
 # auto_sync=True starts Eventbrite sync in background immediately.
-app = create_app_with_db(auto_sync=True)
+_app = None
+def __getattr__(name):
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app_with_db(auto_sync=True)
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 if __name__ == "__main__":
     main()